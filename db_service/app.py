@@ -1,21 +1,40 @@
 # db_service/app.py
+import asyncio, json
+from datetime import datetime
 from typing import AsyncGenerator, List
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from sqlalchemy import delete
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import delete, text
 from database import AsyncSessionLocal, engine
-import models, schemas, crud
+import models, schemas, crud, migrations
+from cache import cache
+from events import broker, FINAL_STATUSES
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import uvicorn
 
 app = FastAPI(title="Vid-Obj Hub DB Service")
 
+VIDEO_OBJECTS_ADAPTER = TypeAdapter(List[schemas.VideoObject])
+
+# Интервал комментариев-пингов в SSE (держит соединение через прокси)
+SSE_PING_SECONDS = 15.0
+# Максимальное ожидание одного long-poll запроса
+LONG_POLL_MAX_SECONDS = 60.0
+
 # Создание таблиц при старте
 @app.on_event("startup")
 async def startup():
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Триграммный индекс словаря label'ов (ix_labels_norm_trgm)
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(models.Base.metadata.create_all)
+        # Колонки и индексы, появившиеся в уже существующих таблицах
+        await conn.run_sync(migrations.upgrade)
+    async with AsyncSessionLocal() as session:
+        await crud.backfill_labels(session)
 
 # Dependency для работы с базой
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -28,25 +47,83 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 @app.post("/videos/", response_model=schemas.Video | None)
 async def create_video(info: schemas.VideoCreate, db: AsyncSession = Depends(get_db)):
-    duplicate = await crud.get_video_by_hash(db, info.video_hash)
-    if duplicate:
-        data = schemas.Video.from_orm(duplicate).model_dump(mode="json")
-        data["duplicate"] = True
-        return JSONResponse(status_code=200, content=data)
+    db_video, created = await crud.create_video(db, info)
+    data = schemas.Video.from_orm(db_video).model_dump(mode="json")
+    data["duplicate"] = not created
+    return JSONResponse(status_code=201 if created else 200, content=data)
 
-    new_video = await crud.create_video(db, info)
-    data = schemas.Video.from_orm(new_video).model_dump(mode="json")
-    data["duplicate"] = False
-    return JSONResponse(status_code=201, content=data)
 
+# Объявлен раньше /videos/{video_id}, иначе "search" разбирался бы как video_id
+@app.get("/videos/search", response_model=schemas.VideoSearchPage)
+async def search_videos(label: List[str] = Query([]), labels_mode: str = "all",
+                        min_count: int | None = Query(None, ge=1),
+                        min_confidence: float | None = Query(None, ge=0, le=1),
+                        status: str | None = None,
+                        uploaded_after: datetime | None = None, uploaded_before: datetime | None = None,
+                        limit: int = Query(20, ge=1, le=100), cursor: str | None = None,
+                        db: AsyncSession = Depends(get_db)):
+    """
+    Поиск видео по критериям, например:
+    /videos/search?label=car&label=person&labels_mode=all&status=processed&uploaded_after=2023-01-01
+    """
+    if labels_mode not in ("all", "any"):
+        raise HTTPException(status_code=422, detail="labels_mode must be 'all' or 'any'")
+    try:
+        return await crud.search_videos(
+            db, label, labels_mode, min_count, min_confidence, status,
+            uploaded_after, uploaded_before, limit, cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-@app.get("/videos/{video_id}", response_model=schemas.Video)
-async def read_video(video_id: int, db: AsyncSession = Depends(get_db)):
-    db_video = await crud.get_video(db, video_id)
+
+@app.get("/videos/by-hash/{video_hash}", response_model=schemas.Video)
+async def read_video_by_hash(video_hash: str, db: AsyncSession = Depends(get_db)):
+    db_video = await crud.get_video_by_hash(db, video_hash)
     if db_video is None:
         raise HTTPException(status_code=404, detail="Video not found")
     return db_video
 
+
+async def cached_response(request: Request, key: str, load) -> Response:
+    """
+    Read-through: тело ответа из кэша или load() (сериализованный JSON, None — 404).
+    Совпавший If-None-Match — 304 без тела.
+    """
+    entry = await cache.get(key)
+    if entry is None:
+        token = await cache.begin_load(key)
+        try:
+            body = await load()
+            if body is None:
+                raise HTTPException(status_code=404, detail="Video not found")
+            etag = await cache.set(key, body, token)
+        finally:
+            cache.end_load(key)
+    else:
+        etag, body = entry
+    if request.headers.get("if-none-match") == etag:
+        cache.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.get("/videos/{video_id}", response_model=schemas.Video)
+async def read_video(video_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        db_video = await crud.get_video(db, video_id)
+        return None if db_video is None else schemas.Video.model_validate(db_video).model_dump_json().encode()
+    return await cached_response(request, f"video:{video_id}", load)
+
+@app.get("/videos/{video_id}/full", response_model=schemas.VideoWithObjects)
+async def read_video_with_objects(video_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        db_video = await crud.get_video_with_objects(db, video_id)
+        if db_video is None:
+            return None
+        return schemas.VideoWithObjects.model_validate(db_video, from_attributes=True).model_dump_json().encode()
+    return await cached_response(request, f"full:{video_id}", load)
+
 @app.put("/videos/{video_id}", response_model=schemas.Video)
 async def update_video_endpoint(video_id: int, video_update: schemas.VideoUpdate, db: AsyncSession = Depends(get_db)):
     db_video = await crud.get_video(db, video_id)
@@ -60,18 +137,102 @@ async def update_video_endpoint(video_id: int, video_update: schemas.VideoUpdate
 
     await db.commit()
     await db.refresh(db_video)
+    await cache.invalidate_video(video_id)
+    if "status" in update_data or "progress" in update_data:
+        broker.publish(video_id, db_video.status, db_video.progress)
     return db_video
 
 
+async def current_status(video_id: int) -> str | None:
+    # Короткая сессия: соединение не держится, пока клиент ждёт событий
+    async with AsyncSessionLocal() as session:
+        db_video = await crud.get_video(session, video_id)
+        return None if db_video is None else db_video.status
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/videos/{video_id}/events")
+async def video_events(video_id: int, request: Request):
+    """
+    SSE-поток смен статуса видео: сначала текущий статус, затем каждое изменение
+    (event: status) и отчёты о ходе обработки (event: progress);
+    поток закрывается после processed / error.
+    """
+    queue = broker.subscribe(video_id)
+    status = await current_status(video_id)
+    if status is None:
+        broker.unsubscribe(video_id, queue)
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    async def stream(status: str):
+        try:
+            yield sse("status", {"id": video_id, "status": status})
+            while status not in FINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if event["status"] != status:
+                    status = event["status"]
+                    yield sse("status", {"id": video_id, "status": status})
+                elif event["progress"] is not None:
+                    yield sse("progress", {"id": video_id, **event["progress"]})
+        finally:
+            broker.unsubscribe(video_id, queue)
+
+    return StreamingResponse(
+        stream(status), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/videos/{video_id}/wait", response_model=schemas.Video)
+async def wait_video_status(video_id: int, since: str | None = None,
+                            timeout: float = Query(25.0, gt=0, le=LONG_POLL_MAX_SECONDS)):
+    """
+    Long-poll: ждёт, пока статус видео станет отличным от since (не дольше timeout секунд),
+    и возвращает видео. Без since возвращается сразу.
+    """
+    queue = broker.subscribe(video_id)
+    try:
+        status = await current_status(video_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Video not found")
+        # Отчёты о прогрессе статус не меняют — ждём дальше
+        deadline = asyncio.get_running_loop().time() + timeout
+        while since is not None and status == since:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                status = (await asyncio.wait_for(queue.get(), remaining))["status"]
+            except asyncio.TimeoutError:
+                break
+    finally:
+        broker.unsubscribe(video_id, queue)
+    async with AsyncSessionLocal() as session:
+        return await crud.get_video(session, video_id)
+
+
 @app.get("/videos/", response_model=list[schemas.Video])
 async def read_videos(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     videos = await crud.list_videos(db, skip=skip, limit=limit)
     return videos
 
 @app.get("/videos/{video_id}/objects", response_model=list[schemas.VideoObject])
-async def read_video_objects(video_id: int, db: AsyncSession = Depends(get_db)):
-    objects = await crud.get_video_objects(db, video_id)
-    return objects
+async def read_video_objects(video_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        objects = await crud.get_video_objects(db, video_id)
+        return VIDEO_OBJECTS_ADAPTER.dump_json(
+            [schemas.VideoObject.model_validate(o, from_attributes=True) for o in objects]
+        )
+    return await cached_response(request, f"objects:{video_id}", load)
 
 
 @app.delete("/videos/{video_id}/objects")
@@ -87,6 +248,7 @@ async def delete_objects_for_video(video_id: int, db: AsyncSession = Depends(get
     # Выполняем удаление
     await db.execute(delete(models.VideoObject).where(models.VideoObject.video_id == video_id))
     await db.commit()
+    await cache.invalidate_video(video_id)
     return {"detail": f"VideoObjects for video {video_id} removed"}
 
 
@@ -105,13 +267,105 @@ async def create_object_for_video(video_id: int, vo_data: schemas.VideoObjectCre
         raise HTTPException(status_code=404, detail="Video not found")
 
     new_vo = await crud.create_video_object(db, vo_data)
+    await cache.invalidate_video(video_id)
     return new_vo
 
 
-@app.get("/search", response_model=List[schemas.SearchResult])
-async def search(q: str, db: AsyncSession = Depends(get_db)):
-    results = await crud.search_objects(db, q)
-    return results
+@app.put("/videos/{video_id}/results", response_model=schemas.Video)
+async def replace_video_results(video_id: int, results: schemas.VideoResults, db: AsyncSession = Depends(get_db)):
+    """
+    Записывает итог обработки одной транзакцией: удаляет старые VideoObject,
+    вставляет новые пачкой и обновляет статус (и прочие поля) видео.
+    """
+    db_video = await crud.get_video(db, video_id)
+    if not db_video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    db_video = await crud.replace_video_results(db, db_video, results)
+    await cache.invalidate_video(video_id)
+    broker.publish(video_id, db_video.status)
+    return db_video
+
+
+@app.post("/videos/{video_id}/progress/segments", response_model=schemas.Video)
+async def complete_segment(video_id: int, segment: schemas.SegmentDone, db: AsyncSession = Depends(get_db)):
+    """
+    Отрезок длинного видео обработан: +1 к progress.segments_done
+    и segment.frames к progress.frames_done.
+    """
+    db_video = await crud.complete_segment(db, video_id, segment.frames)
+    if db_video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    await cache.invalidate_video(video_id)
+    broker.publish(video_id, db_video.status, db_video.progress)
+    return db_video
+
+
+@app.post("/videos/{video_id}/lease", response_model=schemas.Lease)
+async def acquire_lease(video_id: int, lease: schemas.LeaseRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Аренда обработки видео задачей lease.owner на lease.seconds секунд (повторный
+    вызов владельцем продлевает её). acquired=false — видео обрабатывает другая задача.
+    """
+    acquired = await crud.acquire_lease(db, video_id, lease.owner, lease.seconds)
+    db_video = await crud.get_video(db, video_id)
+    if db_video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    await db.refresh(db_video)
+    return {"acquired": acquired, "owner": db_video.lease_owner, "expires": db_video.lease_until}
+
+
+@app.delete("/videos/{video_id}/lease", status_code=204)
+async def release_lease(video_id: int, owner: str | None = None, db: AsyncSession = Depends(get_db)):
+    await crud.release_lease(db, video_id, owner)
+    return Response(status_code=204)
+
+
+@app.get("/sources/lookup", response_model=schemas.Video)
+async def lookup_source(url: str | None = None, extractor: str | None = None,
+                        extractor_id: str | None = None, db: AsyncSession = Depends(get_db)):
+    db_video = await crud.find_source(db, url, extractor, extractor_id)
+    if db_video is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return db_video
+
+
+@app.post("/sources/", response_model=schemas.SourceUrl)
+async def create_source(source: schemas.SourceUrlCreate, db: AsyncSession = Depends(get_db)):
+    if await crud.get_video(db, source.video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return await crud.add_source(db, source)
+
+
+@app.get("/search", response_model=schemas.SearchPage)
+async def search(q: str, match: str = "prefix", limit: int = Query(20, ge=1, le=100),
+                 cursor: str | None = None, db: AsyncSession = Depends(get_db)):
+    """
+    Поиск объектов по label: match = exact | prefix | substring,
+    результаты по убыванию best_confidence и total_count, далее — с next_cursor.
+    """
+    if match not in crud.LABEL_MATCH_MODES:
+        raise HTTPException(status_code=422, detail=f"match must be one of {crud.LABEL_MATCH_MODES}")
+    try:
+        return await crud.search_objects(db, q, match, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Метрики кэша чтения в текстовом формате Prometheus.
+    """
+    return (
+        "# TYPE db_cache_hits_total counter\n"
+        f"db_cache_hits_total {cache.hits}\n"
+        "# TYPE db_cache_misses_total counter\n"
+        f"db_cache_misses_total {cache.misses}\n"
+        "# TYPE db_cache_not_modified_total counter\n"
+        f"db_cache_not_modified_total {cache.not_modified}\n"
+        "# TYPE db_cache_hit_ratio gauge\n"
+        f"db_cache_hit_ratio {cache.hit_ratio:.4f}\n"
+    )
 
 
 if __name__ == '__main__':
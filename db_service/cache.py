@@ -0,0 +1,202 @@
+# db_service/cache.py
+"""
+Read-through кэш ответов GET /videos/{id}, /videos/{id}/objects, /videos/{id}/full.
+Хранятся уже сериализованные тела ответов вместе с ETag, поэтому попадание
+в кэш не трогает базу и не сериализует заново, а совпавший If-None-Match даёт 304.
+
+Хранилище:
+  - по умолчанию — LRU с TTL в памяти процесса;
+  - DB_CACHE_URL=redis://... — общий Redis для нескольких реплик сервиса.
+Записи сбрасываются обработчиками PUT/POST/DELETE; TTL ограничивает
+устаревание, если запись изменили в обход сервиса.
+
+Гонка «загрузка из базы / сброс»: ответ, прочитанный до сброса, не должен
+попасть в кэш после него. Поколения в ResponseCache._loads защищают от этого
+только в пределах одного процесса; для Redis у каждого ключа есть ещё версия
+(dbver:<ключ>), которую сброс увеличивает INCR, а запись выполняется Lua-скриптом,
+только если версия не изменилась с начала загрузки — это защищает и от сброса
+в другой реплике.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+from decouple import config
+
+DB_CACHE_TTL = config("DB_CACHE_TTL", default=60.0, cast=float)
+DB_CACHE_SIZE = config("DB_CACHE_SIZE", default=10000, cast=int)
+DB_CACHE_URL = config("DB_CACHE_URL", default="")
+
+
+class LocalBackend:
+    """
+    LRU с TTL в памяти процесса.
+    """
+
+    def __init__(self, maxsize: int = DB_CACHE_SIZE, ttl: float = DB_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def version(self, key: str) -> int | None:
+        # Один процесс: достаточно поколений ResponseCache
+        return None
+
+    async def get(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, version: int | None = None):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+
+class RedisBackend:
+    """
+    Общее хранилище в Redis (пакет redis, импортируется только при DB_CACHE_URL).
+    Версии ключей живут VERSION_TTL — с запасом дольше любой загрузки из базы.
+    """
+
+    VERSION_TTL = 3600
+    # KEYS[1] — тело, KEYS[2] — версия; ARGV: значение, TTL в мс, ожидаемая версия
+    SET_IF_VERSION = """
+        if tonumber(redis.call('get', KEYS[2]) or '0') == tonumber(ARGV[3]) then
+            redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, url: str, ttl: float = DB_CACHE_TTL):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self._redis = redis.from_url(url)
+        self._set_if_version = self._redis.register_script(self.SET_IF_VERSION)
+
+    async def version(self, key: str) -> int | None:
+        return int(await self._redis.get(f"dbver:{key}") or 0)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._redis.get(f"dbcache:{key}")
+
+    async def set(self, key: str, value: bytes, version: int | None = None):
+        if version is None:
+            await self._redis.set(f"dbcache:{key}", value, px=int(self.ttl * 1000))
+            return
+        await self._set_if_version(
+            keys=[f"dbcache:{key}", f"dbver:{key}"], args=[value, int(self.ttl * 1000), version],
+        )
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.incr(f"dbver:{key}")
+                pipe.expire(f"dbver:{key}", self.VERSION_TTL)
+            pipe.delete(*(f"dbcache:{key}" for key in keys))
+            await pipe.execute()
+
+
+class ResponseCache:
+    """
+    Кэш тел ответов с ETag и счётчиками попаданий.
+    Значение в хранилище: b"<etag>\\n<json>".
+    Загрузка из базы: token = await begin_load(key), затем set(key, body, token)
+    и end_load(key).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        # Загрузки из базы в процессе: ключ → [поколение, число загрузок].
+        # Сброс ключа увеличивает поколение, и ответ, прочитанный до сброса,
+        # не записывается в кэш. Запись удаляется, когда загрузок не осталось,
+        # поэтому словарь не растёт с числом когда-либо изменённых видео
+        self._loads: dict[str, list[int]] = {}
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def generation(self, key: str) -> int:
+        entry = self._loads.get(key)
+        return entry[0] if entry is not None else 0
+
+    async def begin_load(self, key: str) -> tuple[int, int | None]:
+        """
+        Отмечает начало загрузки ключа из базы; возвращает (поколение, версия
+        в хранилище) для set(). Каждому успешному вызову должен соответствовать end_load().
+        """
+        entry = self._loads.setdefault(key, [0, 0])
+        entry[1] += 1
+        generation = entry[0]
+        try:
+            version = await self.backend.version(key)
+        except BaseException:
+            self.end_load(key)
+            raise
+        return generation, version
+
+    def end_load(self, key: str):
+        entry = self._loads[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._loads[key]
+
+    async def get(self, key: str) -> tuple[str, bytes] | None:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, body = value.split(b"\n", 1)
+        return etag.decode(), body
+
+    async def set(self, key: str, body: bytes, token: tuple[int, int | None]) -> str:
+        etag = self.make_etag(body)
+        generation, version = token
+        if self.generation(key) == generation:
+            await self.backend.set(key, etag.encode() + b"\n" + body, version)
+        return etag
+
+    async def invalidate_video(self, video_id: int):
+        keys = video_keys(video_id)
+        for key in keys:
+            entry = self._loads.get(key)
+            if entry is not None:
+                entry[0] += 1
+        await self.backend.delete(*keys)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def video_keys(video_id: int) -> tuple[str, str, str]:
+    return f"video:{video_id}", f"objects:{video_id}", f"full:{video_id}"
+
+
+def create_cache() -> ResponseCache:
+    backend = RedisBackend(DB_CACHE_URL) if DB_CACHE_URL else LocalBackend()
+    return ResponseCache(backend)
+
+
+cache = create_cache()
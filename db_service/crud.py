@@ -1,19 +1,67 @@
 # db_service/crud.py
-from sqlalchemy import func
+from sqlalchemy import func, delete, insert, update, case, or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.sql.expression import ClauseElement, Executable
+import asyncio
+import json
+from datetime import datetime, timedelta
 import models, schemas
 
+# Режимы сопоставления запроса со словарём label'ов
+LABEL_MATCH_MODES = ("exact", "prefix", "substring")
+# Сколько строк максимум считать точно для estimated_total (вне PostgreSQL)
+COUNT_CAP = 10000
+
+
+class _Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) <select> — оценка числа строк планировщиком PostgreSQL.
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
 async def get_video(session: AsyncSession, video_id: int):
     result = await session.execute(select(models.Video).where(models.Video.id == video_id))
     return result.scalars().first()
 
-async def create_video(session: AsyncSession, video: schemas.VideoCreate):
-    db_video = models.Video(**video.dict())
-    session.add(db_video)
+async def get_video_with_objects(session: AsyncSession, video_id: int):
+    """
+    Видео с объектами (objects_summary) одним запросом (LEFT JOIN).
+    """
+    result = await session.execute(
+        select(models.Video)
+        .options(joinedload(models.Video.objects_summary))
+        .where(models.Video.id == video_id)
+    )
+    return result.unique().scalars().first()
+
+async def create_video(session: AsyncSession, video: schemas.VideoCreate) -> tuple[models.Video, bool]:
+    """
+    Регистрирует видео одним INSERT ... ON CONFLICT (video_hash) DO NOTHING:
+    при одновременной загрузке одного файла запись создаёт только один запрос.
+    Возвращает (видео, создано ли оно этим вызовом).
+    """
+    result = await session.execute(
+        _insert_ignore(session, models.Video, "video_hash")
+        .values(**video.dict())
+        .returning(models.Video.id)
+    )
+    video_id = result.scalar()
     await session.commit()
-    await session.refresh(db_video)
-    return db_video
+    if video_id is None:
+        return await get_video_by_hash(session, video.video_hash), False
+    return await get_video(session, video_id), True
 
 async def list_videos(session: AsyncSession, skip: int = 0, limit: int = 100):
     result = await session.execute(select(models.Video).offset(skip).limit(limit))
@@ -25,6 +73,7 @@ async def get_video_objects(session: AsyncSession, video_id: int):
 
 async def create_video_object(session: AsyncSession, video_object: schemas.VideoObjectCreate):
     db_vo = models.VideoObject(**video_object.dict())
+    await add_labels(session, [db_vo.label])
     session.add(db_vo)
     await session.commit()
     await session.refresh(db_vo)
@@ -43,26 +92,351 @@ async def update_video(db: AsyncSession, video_id: int, video_data: dict):
     await db.refresh(db_video)
     return db_video
 
+async def replace_video_results(db: AsyncSession, db_video: models.Video, results: schemas.VideoResults):
+    """
+    Атомарно заменяет все VideoObject видео (bulk insert) и обновляет поля видео.
+    """
+    await db.execute(delete(models.VideoObject).where(models.VideoObject.video_id == db_video.id))
+    if results.objects:
+        await add_labels(db, [obj.label for obj in results.objects])
+        await db.execute(
+            insert(models.VideoObject),
+            [{"video_id": db_video.id, **obj.dict()} for obj in results.objects],
+        )
+    for key, value in results.dict(exclude={"objects"}, exclude_none=True).items():
+        setattr(db_video, key, value)
+    # Итог записан — продолжать больше нечего
+    db_video.checkpoint = None
+    await db.commit()
+    await db.refresh(db_video)
+    return db_video
+
+async def acquire_lease(db: AsyncSession, video_id: int, owner: str, seconds: float) -> bool:
+    """
+    Берёт (или продлевает) аренду обработки видео одним условным UPDATE:
+    удаётся, если аренды нет, она истекла или уже принадлежит owner.
+    Продление не сокращает уже выданную владельцу аренду.
+    """
+    now = datetime.utcnow()
+    until = now + timedelta(seconds=seconds)
+    result = await db.execute(
+        update(models.Video)
+        .where(
+            models.Video.id == video_id,
+            or_(
+                models.Video.lease_until.is_(None),
+                models.Video.lease_until < now,
+                models.Video.lease_owner == owner,
+            ),
+        )
+        .values(
+            lease_owner=owner,
+            lease_until=case(
+                (and_(models.Video.lease_owner == owner, models.Video.lease_until > until),
+                 models.Video.lease_until),
+                else_=until,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def release_lease(db: AsyncSession, video_id: int, owner: str | None = None):
+    """
+    Снимает аренду; с owner — только если она принадлежит ему.
+    """
+    stmt = update(models.Video).where(models.Video.id == video_id)
+    if owner is not None:
+        stmt = stmt.where(models.Video.lease_owner == owner)
+    await db.execute(
+        stmt.values(lease_owner=None, lease_until=None).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+_segment_lock = asyncio.Lock()
+
+async def complete_segment(db: AsyncSession, video_id: int, frames: int):
+    """
+    Засчитывает готовый отрезок в Video.progress (segments_done, frames_done, percent).
+    Строка блокируется до конца транзакции (SELECT ... FOR UPDATE в PostgreSQL;
+    SQLite его игнорирует, поэтому внутри процесса обновления ещё и идут по очереди),
+    и одновременные отрезки не теряют обновления друг друга.
+    """
+    async with _segment_lock:
+        res = await db.execute(select(models.Video).where(models.Video.id == video_id).with_for_update())
+        db_video = res.scalars().first()
+        if db_video is None:
+            return None
+        progress = dict(db_video.progress or {})
+        progress["segments_done"] = progress.get("segments_done", 0) + 1
+        progress["frames_done"] = progress.get("frames_done", 0) + frames
+        if progress.get("frames_total"):
+            progress["percent"] = round(min(100.0, 100.0 * progress["frames_done"] / progress["frames_total"]), 1)
+        db_video.progress = progress
+        await db.commit()
+    await db.refresh(db_video)
+    return db_video
+
 async def get_video_by_hash(db: AsyncSession, video_hash: str):
     res = await db.execute(select(models.Video).where(models.Video.video_hash == video_hash))
     return res.scalars().first()
 
 
-async def search_objects(db: AsyncSession, query: str, limit: int = 3):
+async def find_source(db: AsyncSession, url: str | None = None,
+                      extractor: str | None = None, extractor_id: str | None = None):
+    """
+    Видео, уже загруженное по этой ссылке: по нормализованному URL
+    или по каноническому id экстрактора.
+    """
+    conditions = []
+    if url:
+        conditions.append(models.SourceUrl.url == url)
+    if extractor and extractor_id:
+        conditions.append(
+            (models.SourceUrl.extractor == extractor) & (models.SourceUrl.extractor_id == extractor_id)
+        )
+    if not conditions:
+        return None
     stmt = (
-        select(models.VideoObject)
-        .where(models.VideoObject.label.ilike(f"%{query}%"))
-        .order_by(func.random())         # случайный порядок
-        .limit(limit)
+        select(models.Video)
+        .join(models.SourceUrl, models.SourceUrl.video_id == models.Video.id)
+        .where(or_(*conditions))
+        .limit(1)
     )
-    rows = (await db.execute(stmt)).scalars().all()
+    return (await db.execute(stmt)).scalars().first()
+
+async def add_source(db: AsyncSession, source: schemas.SourceUrlCreate):
+    res = await db.execute(select(models.SourceUrl).where(models.SourceUrl.url == source.url))
+    db_source = res.scalars().first()
+    if db_source is None:
+        db_source = models.SourceUrl(**source.dict())
+        db.add(db_source)
+    else:
+        for key, value in source.dict(exclude_none=True).items():
+            setattr(db_source, key, value)
+    await db.commit()
+    await db.refresh(db_source)
+    return db_source
+
+
+def _insert_ignore(db: AsyncSession, model, *conflict_columns: str):
+    """
+    INSERT, пропускающий строки с уже существующим уникальным ключом
+    (conflict_columns — только с этим ключом; MySQL игнорирует любой).
+    """
+    dialect = db.bind.dialect.name
+    index_elements = list(conflict_columns) or None
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(model).prefix_with("IGNORE")  # MySQL / MariaDB
+
+async def add_labels(db: AsyncSession, labels: list[str]):
+    """
+    Пополняет словарь label'ов (без commit — в транзакции вызывающего).
+    """
+    names = sorted(set(labels))
+    if names:
+        await db.execute(
+            _insert_ignore(db, models.Label),
+            [{"name": name, "norm": name.strip().lower()} for name in names],
+        )
+
+async def backfill_labels(db: AsyncSession):
+    """
+    Заполняет пустой словарь из уже сохранённых video_objects (однократно).
+    """
+    if (await db.execute(select(models.Label.id).limit(1))).first() is not None:
+        return
+    rows = await db.execute(select(models.VideoObject.label).distinct())
+    await add_labels(db, [label for (label,) in rows if label])
+    await db.commit()
+
+async def match_labels(db: AsyncSession, query: str, match: str = "prefix") -> list[str]:
+    """
+    Label'ы из словаря, подходящие под запрос: exact — совпадение,
+    prefix — начинаются с запроса, substring — содержат его (pg_trgm в PostgreSQL).
+    """
+    norm = query.strip().lower()
+    if not norm:
+        return []
+    pattern = norm.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if match == "exact":
+        condition = models.Label.norm == norm
+    elif match == "prefix":
+        condition = models.Label.norm.like(f"{pattern}%", escape="\\")
+    else:
+        condition = models.Label.norm.like(f"%{pattern}%", escape="\\")
+    rows = await db.execute(select(models.Label.name).where(condition))
+    return [name for (name,) in rows]
+
+def encode_cursor(best_confidence: float, total_count: int, object_id: int) -> str:
+    return f"{best_confidence!r}:{total_count}:{object_id}"
+
+def decode_cursor(cursor: str) -> tuple[float, int, int]:
+    best_confidence, total_count, object_id = cursor.split(":")
+    return float(best_confidence), int(total_count), int(object_id)
+
+def _after_cursor(cursor: tuple[float, int, int]):
+    """
+    Строки строго после курсора в порядке best_confidence DESC, total_count DESC, id DESC.
+    """
+    conf, count, object_id = cursor
+    vo = models.VideoObject
+    return or_(
+        vo.best_confidence < conf,
+        and_(vo.best_confidence == conf, vo.total_count < count),
+        and_(vo.best_confidence == conf, vo.total_count == count, vo.id < object_id),
+    )
+
+async def search_objects(db: AsyncSession, query: str, match: str = "prefix",
+                         limit: int = 20, cursor: str | None = None) -> schemas.SearchPage:
+    """
+    Ищет объекты по label через словарь и индекс ix_video_objects_label_rank:
+    лучшие по best_confidence, затем total_count; пагинация по курсору (keyset).
+    """
+    labels = await match_labels(db, query, match)
+    if not labels:
+        return schemas.SearchPage(items=[])
+
+    vo = models.VideoObject
+    stmt = (
+        select(vo, models.Video.status, models.Video.s3_url)
+        .join(models.Video, models.Video.id == vo.video_id)
+        .where(vo.label.in_(labels))
+        .order_by(vo.best_confidence.desc(), vo.total_count.desc(), vo.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.where(_after_cursor(decode_cursor(cursor)))
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.best_confidence, last.total_count, last.id)
     # превращаем в список схем
-    return [
+    items = [
         schemas.SearchResult(
             video_id=r.video_id,
             label=r.label,
             best_second=r.best_second,
             total_count=r.total_count,
+            best_confidence=r.best_confidence,
+            status=status,
+            s3_url=s3_url,
         )
-        for r in rows
-    ]
\ No newline at end of file
+        for r, status, s3_url in rows
+    ]
+    return schemas.SearchPage(items=items, next_cursor=next_cursor)
+
+async def _estimate_total(db: AsyncSession, stmt) -> tuple[int, bool]:
+    """
+    Число строк запроса: оценка планировщика в PostgreSQL,
+    иначе точный подсчёт, но не дальше COUNT_CAP строк.
+    """
+    if db.bind.dialect.name == "postgresql":
+        plan = (await db.execute(_Explain(stmt))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+    capped = stmt.limit(COUNT_CAP + 1).subquery()
+    total = (await db.execute(select(func.count()).select_from(capped))).scalar()
+    return min(total, COUNT_CAP), total > COUNT_CAP
+
+def encode_video_cursor(upload_time: datetime, video_id: int) -> str:
+    return f"{upload_time.isoformat()}|{video_id}"
+
+def decode_video_cursor(cursor: str) -> tuple[datetime, int]:
+    upload_time, video_id = cursor.split("|")
+    return datetime.fromisoformat(upload_time), int(video_id)
+
+async def search_videos(db: AsyncSession, labels: list[str] | None = None, labels_mode: str = "all",
+                        min_count: int | None = None, min_confidence: float | None = None,
+                        status: str | None = None, uploaded_after: datetime | None = None,
+                        uploaded_before: datetime | None = None, limit: int = 20,
+                        cursor: str | None = None) -> schemas.VideoSearchPage:
+    """
+    Поиск видео по нескольким критериям:
+      - labels: точные label'ы; labels_mode="all" — видео содержит все, "any" — хотя бы один;
+        min_count / min_confidence применяются к каждому такому label'у
+        (индекс ix_video_objects_label_video),
+      - status и диапазон upload_time [uploaded_after, uploaded_before)
+        (индекс ix_videos_status_upload_time).
+    Сортировка по upload_time DESC, id DESC; пагинация по курсору.
+    """
+    vo, video = models.VideoObject, models.Video
+
+    conditions = []
+    if status:
+        conditions.append(video.status == status)
+    if uploaded_after:
+        conditions.append(video.upload_time >= uploaded_after)
+    if uploaded_before:
+        conditions.append(video.upload_time < uploaded_before)
+
+    object_conditions = []
+    if labels:
+        names = []
+        for label in labels:
+            found = await match_labels(db, label, "exact")
+            if not found and labels_mode == "all":
+                return schemas.VideoSearchPage(items=[])
+            names.extend(found)
+        if not names:
+            return schemas.VideoSearchPage(items=[])
+        object_conditions.append(vo.label.in_(names))
+        if min_count is not None:
+            object_conditions.append(vo.total_count >= min_count)
+        if min_confidence is not None:
+            object_conditions.append(vo.best_confidence >= min_confidence)
+
+        matched = select(vo.video_id).where(*object_conditions)
+        if labels_mode == "all":
+            matched = matched.group_by(vo.video_id).having(func.count(func.distinct(vo.label)) == len(set(names)))
+        conditions.append(video.id.in_(matched))
+    elif min_count is not None or min_confidence is not None:
+        raise ValueError("min_count / min_confidence require labels")
+
+    base = select(video.id).where(*conditions)
+    estimated_total, is_estimate = await _estimate_total(db, base)
+
+    page = (
+        select(video.id, video.upload_time)
+        .where(*conditions)
+        .order_by(video.upload_time.desc(), video.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        after_time, after_id = decode_video_cursor(cursor)
+        page = page.where(or_(
+            video.upload_time < after_time,
+            and_(video.upload_time == after_time, video.id < after_id),
+        ))
+    rows = (await db.execute(page)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_video_cursor(rows[-1].upload_time, rows[-1].id)
+    ids = [row.id for row in rows]
+    if not ids:
+        return schemas.VideoSearchPage(items=[], estimated_total=estimated_total, total_is_estimate=is_estimate)
+
+    # Видео страницы вместе с подошедшими объектами — одним запросом
+    stmt = (
+        select(video)
+        .outerjoin(vo, and_(vo.video_id == video.id, *object_conditions))
+        .options(contains_eager(video.objects_summary))
+        .where(video.id.in_(ids))
+    )
+    by_id = {v.id: v for v in (await db.execute(stmt)).unique().scalars().all()}
+    return schemas.VideoSearchPage(
+        items=[schemas.VideoWithObjects.model_validate(by_id[i], from_attributes=True) for i in ids],
+        next_cursor=next_cursor,
+        estimated_total=estimated_total,
+        total_is_estimate=is_estimate,
+    )
@@ -0,0 +1,45 @@
+# db_service/events.py
+"""
+Уведомления о смене статуса и прогресса обработки видео для SSE
+(/videos/{id}/events) и long-poll (/videos/{id}/wait). События
+{"status": ..., "progress": ...} публикуют обработчики PUT,
+подписчики получают их без опроса базы.
+Брокер живёт в памяти процесса: при нескольких репликах db_service
+подписчик должен попадать на ту же реплику, что и запись (или ждать
+до таймаута и перечитать статус).
+"""
+import asyncio
+from collections import defaultdict
+
+# Статусы, после которых обработка видео завершена
+FINAL_STATUSES = ("processed", "error")
+# Сколько непрочитанных событий держать на подписчика
+QUEUE_SIZE = 16
+
+
+class StatusBroker:
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, video_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[video_id].add(queue)
+        return queue
+
+    def unsubscribe(self, video_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(video_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[video_id]
+
+    def publish(self, video_id: int, status: str, progress: dict | None = None):
+        event = {"status": status, "progress": progress}
+        for queue in self._subscribers.get(video_id, ()):
+            if queue.full():
+                queue.get_nowait()  # медленному подписчику важно последнее событие
+            queue.put_nowait(event)
+
+
+broker = StatusBroker()
@@ -0,0 +1,52 @@
+# db_service/migrations.py
+"""
+Приведение существующей базы к моделям: create_all создаёт только
+отсутствующие таблицы, а колонки и индексы, добавленные в уже
+существующие таблицы (videos, video_objects), досоздаются здесь.
+Все шаги идемпотентны; выполняются при старте сервиса или вручную:
+
+    python migrations.py
+
+Колонки добавляются как NULL-able без значения по умолчанию. Индексы
+на больших таблицах PostgreSQL лучше заранее создать вручную
+(CREATE INDEX CONCURRENTLY с тем же именем) — тогда они будут пропущены.
+"""
+import asyncio
+
+from sqlalchemy import inspect, text
+
+import models
+
+
+def upgrade(conn):
+    """
+    Добавляет недостающие колонки и индексы (синхронное соединение, для run_sync).
+    """
+    preparer = conn.dialect.identifier_preparer
+    inspector = inspect(conn)
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            conn.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+            ))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def main():
+    from database import engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(upgrade)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,7 @@
 # src/database/models.py
 from datetime import datetime
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, JSON
 
 Base = declarative_base()
 
@@ -17,10 +17,30 @@ class Video(Base):
     user_id = Column(Integer)
     upload_time = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="pending")  # "pending", "processing", "processed"
+    # Режим выборки кадров, с которым получена статистика ("all", "stride", "fps")
+    sampling_mode = Column(String, nullable=True)
+    frame_stride = Column(Integer, nullable=True)  # обрабатывался каждый k-й кадр
+    # С какой моделью и настройками получен результат (для переиспользования)
+    detector_version = Column(String, nullable=True)  # "torch:yolo12n.pt@<sha256[:12]>"
+    imgsz = Column(Integer, nullable=True)
+    analysis_key = Column(String, nullable=True, index=True)
+    # Ход обработки от воркера: frames_done, frames_total, percent, fps,
+    # eta_seconds, labels (предварительные объекты)
+    progress = Column(JSON, nullable=True)
+    # Состояние прерванной обработки: analysis_key, frame, second, partial
+    # (агрегаты LabelAggregator.to_partial) — повторная задача продолжает с frame
+    checkpoint = Column(JSON, nullable=True)
+    # Аренда обработки: задача lease_owner обрабатывает видео до lease_until,
+    # другие задачи для этого видео в это время ничего не делают
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
 
     # Новая связь к сводной таблице
     objects_summary = relationship("VideoObject", back_populates="video")
 
+    # Поиск по критериям: фильтр по статусу и диапазону upload_time с сортировкой по нему
+    __table_args__ = (Index("ix_videos_status_upload_time", "status", "upload_time"),)
+
 class VideoObject(Base):
     """
     Сводная информация о том, сколько объектов класса 'label' найдено в данном видео
@@ -36,4 +56,55 @@ class VideoObject(Base):
     best_confidence = Column(Float, default=0.0)
     best_second = Column(Float, default=0.0)
 
-    video = relationship("Video", back_populates="objects_summary")
\ No newline at end of file
+    video = relationship("Video", back_populates="objects_summary")
+
+    # Поиск видео по нескольким label'ам: label IN (...) → video_id без обращения к таблице
+    __table_args__ = (Index("ix_video_objects_label_video", "label", "video_id"),)
+
+
+# Поиск по label с ранжированием: WHERE label IN (...) ORDER BY best_confidence, total_count, id
+# читается из индекса без сортировки всей таблицы (и продолжается с курсора)
+Index(
+    "ix_video_objects_label_rank",
+    VideoObject.label,
+    VideoObject.best_confidence.desc(),
+    VideoObject.total_count.desc(),
+    VideoObject.id.desc(),
+)
+
+
+class Label(Base):
+    """
+    Словарь встречавшихся label'ов (десятки строк, а не миллионы):
+    запрос сначала сопоставляется со словарём (точно / по префиксу / по подстроке),
+    а video_objects фильтруется уже по точным значениям label.
+    """
+    __tablename__ = "labels"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True)              # как в video_objects.label
+    norm = Column(String, index=True)               # lower(name) для сопоставления с запросом
+
+
+# Поиск по подстроке в PostgreSQL (pg_trgm; расширение создаётся при старте сервиса)
+Index(
+    "ix_labels_norm_trgm", Label.norm,
+    postgresql_using="gin", postgresql_ops={"norm": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+class SourceUrl(Base):
+    """
+    Ссылка, по которой видео уже загружалось: нормализованный URL и канонический
+    id ролика у экстрактора yt-dlp (extractor_key + id) → видео.
+    Проверяется до скачивания, чтобы повторная ссылка не качалась заново.
+    """
+    __tablename__ = "source_urls"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, unique=True, index=True)  # нормализованный URL
+    extractor = Column(String, nullable=True)      # "Youtube", "VK", "Rutube" ...
+    extractor_id = Column(String, nullable=True)
+    video_id = Column(Integer, ForeignKey("videos.id"), index=True)
+    created = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_source_urls_extractor", "extractor", "extractor_id"),)
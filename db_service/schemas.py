@@ -1,6 +1,6 @@
 # db_service/schemas.py
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
 class VideoBase(BaseModel):
@@ -21,6 +21,13 @@ class VideoCreate(BaseModel):
 class Video(VideoBase):
     id: int
     upload_time: datetime
+    sampling_mode: Optional[str] = None
+    frame_stride: Optional[int] = None
+    detector_version: Optional[str] = None
+    imgsz: Optional[int] = None
+    analysis_key: Optional[str] = None
+    progress: Optional[dict] = None
+    checkpoint: Optional[dict] = None
 
     class Config:
         orm_mode = True
@@ -51,9 +58,66 @@ class VideoObject(VideoObjectBase):
     class Config:
         orm_mode = True
 
+class VideoWithObjects(Video):
+    """
+    Видео вместе с агрегатами по объектам (Video.objects_summary) — один ответ
+    вместо /videos/{id} + /videos/{id}/objects.
+    """
+    objects: List[VideoObject] = Field(
+        default=[], validation_alias=AliasChoices("objects", "objects_summary")
+    )
+
+
 class VideoUpdate(BaseModel):
     status: Optional[str] = None
+    video_hash: Optional[str] = None
     s3_url: Optional[str] = None
+    sampling_mode: Optional[str] = None
+    frame_stride: Optional[int] = None
+    detector_version: Optional[str] = None
+    imgsz: Optional[int] = None
+    analysis_key: Optional[str] = None
+    progress: Optional[dict] = None
+    checkpoint: Optional[dict] = None
+
+
+class VideoResults(VideoUpdate):
+    """
+    Итог обработки видео: полностью заменяет VideoObject видео
+    и обновляет его поля (по умолчанию status="processed") одной транзакцией.
+    """
+    status: Optional[str] = "processed"
+    objects: List[VideoObjectBase] = []
+
+
+class SegmentDone(BaseModel):
+    frames: int = Field(0, ge=0)  # сколько кадров видео покрывает отрезок
+
+
+class LeaseRequest(BaseModel):
+    owner: str  # id задачи Celery
+    seconds: float = Field(600.0, gt=0, le=86400)
+
+
+class Lease(BaseModel):
+    acquired: bool
+    owner: Optional[str] = None
+    expires: Optional[datetime] = None
+
+
+class SourceUrlCreate(BaseModel):
+    url: str
+    extractor: Optional[str] = None
+    extractor_id: Optional[str] = None
+    video_id: int
+
+
+class SourceUrl(SourceUrlCreate):
+    id: int
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
 
 
 class SearchResult(BaseModel):
@@ -61,6 +125,31 @@ class SearchResult(BaseModel):
     label: str
     best_second: float
     total_count: int
+    best_confidence: float = 0.0
+    # Поля видео (из того же запроса), чтобы не запрашивать его отдельно
+    status: Optional[str] = None
+    s3_url: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class SearchPage(BaseModel):
+    """
+    Страница результатов поиска; next_cursor передаётся в следующий запрос
+    (None — результатов больше нет).
+    """
+    items: List[SearchResult]
+    next_cursor: Optional[str] = None
+
+
+class VideoSearchPage(BaseModel):
+    """
+    Страница результатов поиска видео по критериям. В objects — только
+    объекты, подошедшие под условия по label'ам. estimated_total — оценка
+    общего числа видео (точное число, если total_is_estimate=False).
+    """
+    items: List[VideoWithObjects]
+    next_cursor: Optional[str] = None
+    estimated_total: int = 0
+    total_is_estimate: bool = False
@@ -0,0 +1,116 @@
+# recognition_service/aggregation.py
+import numpy as np
+
+# Число классов COCO у моделей YOLO; при большем cls_id массивы расширяются
+DEFAULT_NUM_CLASSES = 80
+
+
+class LabelAggregator:
+    """
+    Накопитель агрегированной статистики по классам объектов.
+    Состояние хранится в массивах NumPy, индексированных cls_id:
+      - counts: число появлений,
+      - sum_conf: сумма уверенностей (для среднего),
+      - best_conf: максимальная уверенность (-1 — класс не встречался),
+      - best_sec: время (в секундах), когда наблюдалась максимальная уверенность.
+    Кадр добавляется векторно (bincount / maximum.at), а в имена классов
+    (names движка) индексы переводятся только при выдаче результата.
+    """
+
+    def __init__(self, names: dict | None = None, num_classes: int = DEFAULT_NUM_CLASSES):
+        self.names = dict(names or {})  # {cls_id: label}
+        self.counts = np.zeros(num_classes, dtype=np.int64)
+        self.sum_conf = np.zeros(num_classes, dtype=np.float64)
+        self.best_conf = np.full(num_classes, -1.0, dtype=np.float64)
+        self.best_sec = np.zeros(num_classes, dtype=np.float64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.counts))
+
+    def _grow(self, size: int):
+        extra = size - len(self.counts)
+        if extra <= 0:
+            return
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.sum_conf = np.concatenate([self.sum_conf, np.zeros(extra, dtype=np.float64)])
+        self.best_conf = np.concatenate([self.best_conf, np.full(extra, -1.0, dtype=np.float64)])
+        self.best_sec = np.concatenate([self.best_sec, np.zeros(extra, dtype=np.float64)])
+
+    def add(self, cls_ids, confs, second: float, weight: int = 1):
+        """
+        Добавляет детекции одного кадра: массивы cls_id и уверенностей одинаковой длины.
+        weight — сколько кадров видео представляет этот кадр (шаг выборки),
+        чтобы total_count оставался оценкой по всему видео.
+        """
+        if len(cls_ids) == 0:
+            return
+        cls_ids = np.asarray(cls_ids, dtype=np.intp)
+        confs = np.asarray(confs, dtype=np.float64)
+        self._grow(int(cls_ids.max()) + 1)
+        size = len(self.counts)
+
+        self.counts += np.bincount(cls_ids, minlength=size) * weight
+        self.sum_conf += np.bincount(cls_ids, weights=confs, minlength=size) * weight
+
+        frame_best = np.full(size, -1.0)
+        np.maximum.at(frame_best, cls_ids, confs)
+        improved = frame_best > self.best_conf
+        self.best_conf[improved] = frame_best[improved]
+        self.best_sec[improved] = second
+
+    def add_detections(self, detections, second: float, weight: int = 1):
+        """
+        Добавляет в статистику детекции одного кадра (engine.Detections).
+        """
+        self.add(detections.cls_ids, detections.confs, second, weight)
+
+    def _label(self, cls_id: int) -> str:
+        return self.names.get(cls_id, str(cls_id))
+
+    def to_payloads(self, video_id: int) -> list[dict]:
+        """
+        Превращает статистику в список payload'ов для DB-сервиса (VideoObjectCreate).
+        """
+        payloads = []
+        for cls_id in np.flatnonzero(self.counts):
+            total_count = int(self.counts[cls_id])
+            payloads.append({
+                "video_id": video_id,
+                "label": self._label(int(cls_id)),
+                "total_count": total_count,
+                "avg_confidence": float(self.sum_conf[cls_id] / total_count),
+                "best_confidence": float(self.best_conf[cls_id]),
+                "best_second": float(self.best_sec[cls_id]),
+            })
+        return payloads
+
+    def to_partial(self) -> dict:
+        """
+        Частичные агрегаты в JSON-совместимом виде (для слияния отрезков видео):
+        {label: [cls_id, count, sum_conf, best_conf, best_sec]}.
+        """
+        return {
+            self._label(int(cls_id)): [
+                int(cls_id),
+                int(self.counts[cls_id]),
+                float(self.sum_conf[cls_id]),
+                float(self.best_conf[cls_id]),
+                float(self.best_sec[cls_id]),
+            ]
+            for cls_id in np.flatnonzero(self.counts)
+        }
+
+    def merge(self, partial: dict):
+        """
+        Добавляет частичные агрегаты другого отрезка (см. to_partial).
+        При равной уверенности остаётся более ранняя секунда.
+        """
+        for label, (cls_id, count, sum_conf, best_conf, best_sec) in partial.items():
+            self._grow(cls_id + 1)
+            self.names.setdefault(cls_id, label)
+            self.counts[cls_id] += count
+            self.sum_conf[cls_id] += sum_conf
+            if (best_conf > self.best_conf[cls_id]
+                    or (best_conf == self.best_conf[cls_id] and best_sec < self.best_sec[cls_id])):
+                self.best_conf[cls_id] = best_conf
+                self.best_sec[cls_id] = best_sec
@@ -0,0 +1,87 @@
+# recognition_service/benchmark.py
+"""
+Сравнение CPU-бэкендов распознавания на одном ролике:
+
+    python -m recognition_service.benchmark sample.mp4 --model yolo12n.pt \
+        --backends torch onnx openvino --threads 4 --imgsz 640 --max-frames 300
+
+Для каждого бэкенда печатается скорость (кадров/с) и согласие агрегатов
+с первым бэкендом в списке (эталоном): совпадение набора label'ов,
+расхождение total_count и best_confidence по общим label'ам.
+"""
+import argparse
+
+import cv2
+
+from recognition_service.aggregation import LabelAggregator
+from recognition_service.engine import BACKENDS, IMGSZ, THREADS, create_engine
+from recognition_service.pipeline import FramePipeline
+
+
+def run_backend(video_path: str, model_path: str, backend: str, imgsz: int, threads: int,
+                batch_size: int, max_frames: int | None):
+    engine = create_engine(model_path, backend=backend, imgsz=imgsz, threads=threads)
+    engine([_first_frame(video_path)])  # прогрев
+
+    aggregator = LabelAggregator(engine.names)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        pipeline = FramePipeline(
+            cap, engine, aggregator.add_detections, fps=cap.get(cv2.CAP_PROP_FPS) or 30.0,
+            batch_size=batch_size, end_frame=max_frames,
+        )
+        pipeline.run()
+    finally:
+        cap.release()
+    return {p["label"]: p for p in aggregator.to_payloads(0)}, pipeline.throughput
+
+
+def _first_frame(video_path: str):
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        raise SystemExit(f"Cannot read {video_path}")
+    return frame
+
+
+def agreement(reference: dict, other: dict) -> str:
+    labels_ref, labels_other = set(reference), set(other)
+    union = labels_ref | labels_other
+    common = labels_ref & labels_other
+    jaccard = len(common) / len(union) if union else 1.0
+    if not common:
+        return f"labels {jaccard:.2f}"
+    count_diff = max(
+        abs(other[l]["total_count"] - reference[l]["total_count"]) / reference[l]["total_count"]
+        for l in common
+    )
+    conf_diff = max(abs(other[l]["best_confidence"] - reference[l]["best_confidence"]) for l in common)
+    return f"labels {jaccard:.2f}, max count diff {count_diff:.1%}, max best_conf diff {conf_diff:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU recognition backends")
+    parser.add_argument("video")
+    parser.add_argument("--model", default="yolo12n.pt")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    reference = None
+    for backend in args.backends:
+        labels, fps = run_backend(args.video, args.model, backend, args.imgsz, args.threads,
+                                  args.batch_size, args.max_frames)
+        if reference is None:
+            reference = labels
+            note = "reference"
+        else:
+            note = agreement(reference, labels)
+        print(f"{backend:<9} {fps:7.1f} frames/s  {len(labels):3d} labels  {note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,34 @@ from celery import Celery
 from decouple import config
 
 BROKER_URL = config("BROKER_URL")
+# Нужен для chord при параллельной обработке отрезков длинных видео
+RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default=None)
+# Очередь, которую слушают воркеры распознавания
+RECOGNITION_QUEUE = config("RECOGNITION_QUEUE", default="celery")
+# Для Redis/SQS: через сколько секунд неподтверждённая задача (acks_late)
+# выдаётся другому воркеру — должно быть больше времени обработки самого длинного видео
+VISIBILITY_TIMEOUT = config("CELERY_VISIBILITY_TIMEOUT", default=6 * 3600, cast=int)
+
+# Имена задач: продюсеры ставят задачи по имени (см. recognition_service.client),
+# не импортируя код воркера
+PROCESS_VIDEO_TASK = "process_video_task"
+PROCESS_VIDEO_SEGMENT_TASK = "process_video_segment_task"
+MERGE_VIDEO_SEGMENTS_TASK = "merge_video_segments_task"
+MARK_VIDEO_ERROR_TASK = "mark_video_error_task"
+
+RECOGNITION_TASKS = (
+    PROCESS_VIDEO_TASK,
+    PROCESS_VIDEO_SEGMENT_TASK,
+    MERGE_VIDEO_SEGMENTS_TASK,
+    MARK_VIDEO_ERROR_TASK,
+)
 
 celery_app = Celery(
     "recognition_service",
     broker=BROKER_URL,
+    backend=RESULT_BACKEND,
+    # Модуль с задачами (а вместе с ним torch и модель) импортирует только воркер
+    include=["recognition_service.detect"],
 )
 
 # Какие-то настройки по желанию
@@ -16,8 +40,10 @@ celery_app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
-    # можно определить очередь:
-    # task_default_queue='recognition_queue'
+    task_default_queue=RECOGNITION_QUEUE,
+    task_routes={name: {"queue": RECOGNITION_QUEUE} for name in RECOGNITION_TASKS},
+    # Задачи распознавания подтверждаются после выполнения (acks_late), поэтому
+    # воркер не резервирует впрок задачи, которые ждали бы его длинного видео
+    worker_prefetch_multiplier=1,
+    broker_transport_options={"visibility_timeout": VISIBILITY_TIMEOUT},
 )
-
-import recognition_service.detect
\ No newline at end of file
@@ -0,0 +1,29 @@
+# recognition_service/client.py
+"""
+Клиент постановки задач распознавания для веб-API и бота.
+Импортирует только настройки Celery: код воркера (recognition_service.detect),
+torch и модель YOLO в процессы-продюсеры не загружаются.
+"""
+from recognition_service.celery_app import celery_app, PROCESS_VIDEO_TASK
+
+# Должно совпадать с recognition_service.sampling.SAMPLING_MODES
+# (тот модуль не импортируется, чтобы не тянуть cv2 / numpy)
+SAMPLING_MODES = ("all", "stride", "fps", "scene")
+
+
+def enqueue_process_video(video_id: int, sampling_mode: str | None = None, force: bool = False):
+    """
+    Ставит process_video_task в очередь распознавания и возвращает AsyncResult.
+    sampling_mode — необязательное переопределение режима выборки кадров,
+    force — пересчитать, даже если результат с теми же настройками уже есть.
+    """
+    if not isinstance(video_id, int) or video_id <= 0:
+        raise ValueError(f"Invalid video_id: {video_id!r}")
+    kwargs = {}
+    if sampling_mode is not None:
+        if sampling_mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {sampling_mode}")
+        kwargs["sampling_mode"] = sampling_mode
+    if force:
+        kwargs["force"] = True
+    return celery_app.send_task(PROCESS_VIDEO_TASK, args=[video_id], kwargs=kwargs)
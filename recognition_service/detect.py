@@ -1,23 +1,368 @@
 # recognition_service/detect.py
 import os
-import tempfile
+import logging
+import time
+import uuid
 import cv2
 from math import floor
-import requests
 import httpx
-from ultralytics import YOLO
+from celery import chord
 from decouple import config
 
-from recognition_service.celery_app import celery_app
+from recognition_service.celery_app import (
+    celery_app,
+    PROCESS_VIDEO_TASK,
+    PROCESS_VIDEO_SEGMENT_TASK,
+    MERGE_VIDEO_SEGMENTS_TASK,
+    MARK_VIDEO_ERROR_TASK,
+)
+from recognition_service.aggregation import LabelAggregator
+from recognition_service.sampling import resolve_stride, split_segments, SceneChangeSelector
+from recognition_service.pipeline import FramePipeline
+from recognition_service.engine import create_engine, artifact_digest, IMGSZ
+from recognition_service.source import VideoSource, SourceError
 
-# Загружаем модель YOLOv8n (предполагается, что файл yolov8n.pt находится в рабочем каталоге или доступен)
-model = YOLO("yolo12n.pt")
+# Модель YOLO (файл yolo12n.pt в рабочем каталоге или скачивается ultralytics).
+# Бэкенд, потоки и размер входа — RECOGNITION_BACKEND / _THREADS / _IMGSZ (см. engine.py)
+MODEL_PATH = config("RECOGNITION_MODEL", default="yolo12n.pt")
 
 # URL DB-сервиса, например "http://localhost:8000"
 DB_SERVICE_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
+DB_HTTP_TIMEOUT = config("DB_HTTP_TIMEOUT", default=20.0, cast=float)
 
-@celery_app.task(name="process_video_task")
-def process_video_task(video_id: int):
+# Сколько кадров отправляется в модель за один вызов (подбирается под узел, обычно 8–32)
+BATCH_SIZE = config("RECOGNITION_BATCH_SIZE", default=16, cast=int)
+
+# Режим выборки кадров: "all" | "stride" | "fps" | "scene" (см. recognition_service.sampling)
+SAMPLING_MODE = config("RECOGNITION_SAMPLING_MODE", default="all")
+FRAME_STRIDE = config("RECOGNITION_FRAME_STRIDE", default=5, cast=int)
+SAMPLE_FPS = config("RECOGNITION_SAMPLE_FPS", default=2.0, cast=float)
+# Порог смены сцены для режима "scene" (средняя разница яркости 0..255)
+SCENE_THRESHOLD = config("RECOGNITION_SCENE_THRESHOLD", default=6.0, cast=float)
+# Ёмкость очередей между стадиями конвейера; от неё зависит и предел числа
+# буферов кадров (QUEUE_SIZE + BATCH_SIZE + 1, около 6 МБ каждый при 1080p).
+# Чтобы инференция не простаивала, достаточно одной готовой пачки впереди
+QUEUE_SIZE = config("RECOGNITION_QUEUE_SIZE", default=BATCH_SIZE, cast=int)
+
+# Видео длиннее SEGMENT_MIN_SECONDS делится на отрезки по SEGMENT_SECONDS,
+# которые обрабатываются параллельно разными воркерами (0 — выключено).
+# Требует result backend у Celery (CELERY_RESULT_BACKEND).
+SEGMENT_MIN_SECONDS = config("RECOGNITION_SEGMENT_MIN_SECONDS", default=0, cast=float)
+SEGMENT_SECONDS = config("RECOGNITION_SEGMENT_SECONDS", default=120, cast=float)
+
+# Декодировать видео потоково по HTTP, не дожидаясь полного скачивания
+# (для MP4 с moov в конце автоматически используется временный файл)
+STREAM_DECODE = config("RECOGNITION_STREAM_DECODE", default=True, cast=bool)
+# Открывать объект по presigned-ссылке S3 (для приватного бакета)
+PRESIGN_SOURCE = config("RECOGNITION_PRESIGN_SOURCE", default=False, cast=bool)
+# На сколько кадров потоковое чтение может не дойти до CAP_PROP_FRAME_COUNT
+# (оценка контейнера), прежде чем считаться оборвавшимся
+FRAME_COUNT_SLACK = config("RECOGNITION_FRAME_COUNT_SLACK", default=30, cast=int)
+
+# Прогресс обработки (Video.progress): не чаще раза в PROGRESS_SECONDS,
+# PROGRESS_LABELS — сколько предварительных объектов передавать (0 — не передавать)
+PROGRESS_SECONDS = config("RECOGNITION_PROGRESS_SECONDS", default=5.0, cast=float)
+PROGRESS_LABELS = config("RECOGNITION_PROGRESS_LABELS", default=5, cast=int)
+# Не чаще раза в CHECKPOINT_SECONDS вместе с прогрессом сохраняется Video.checkpoint —
+# частичные агрегаты и номер кадра, с которого продолжит повторная задача (0 — выключено)
+CHECKPOINT_SECONDS = config("RECOGNITION_CHECKPOINT_SECONDS", default=30.0, cast=float)
+# Аренда видео задачей process_video_task (вторая задача для того же видео ничего не делает).
+# Продлевается вместе с отчётами о прогрессе; должна покрывать скачивание видео
+LEASE_SECONDS = config("RECOGNITION_LEASE_SECONDS", default=600.0, cast=float)
+
+log = logging.getLogger(__name__)
+
+_engine = None
+
+
+def get_engine():
+    """
+    Загружает движок распознавания при первом обращении — только в процессе
+    воркера, который реально выполняет задачи.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(MODEL_PATH)
+    return _engine
+
+
+_db_client = None
+
+
+def db_client() -> httpx.Client:
+    """
+    HTTP-клиент к DB-сервису, один на процесс воркера: создаётся после fork
+    при первом обращении, соединения переиспользуются между задачами.
+    """
+    global _db_client
+    if _db_client is None:
+        _db_client = httpx.Client(
+            base_url=DB_SERVICE_URL,
+            timeout=httpx.Timeout(DB_HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+        )
+    return _db_client
+
+
+_model_version = None
+
+
+def model_version() -> str:
+    """
+    Идентичность модели: бэкенд, имя и начало sha256 реально загруженного
+    артефакта (весов .pt или экспорта ONNX / OpenVINO), например
+    "onnx:yolo12n.onnx@<sha256[:12]>". Движок загружается, если ещё не загружен.
+    """
+    global _model_version
+    if _model_version is None:
+        engine = get_engine()
+        name = os.path.basename(os.path.normpath(engine.path))
+        _model_version = f"{engine.backend}:{name}@{artifact_digest(engine.path)[:12]}"
+    return _model_version
+
+
+def analysis_settings(mode: str) -> dict:
+    """
+    Модель и настройки конвейера, с которыми получен результат.
+    analysis_key совпадает, только если повторная обработка дала бы тот же результат.
+    """
+    mode_param = {"stride": FRAME_STRIDE, "fps": SAMPLE_FPS, "scene": SCENE_THRESHOLD}.get(mode)
+    sampling = mode if mode_param is None else f"{mode}={mode_param}"
+    return {
+        "detector_version": model_version(),
+        "imgsz": IMGSZ,
+        "sampling_mode": mode,
+        "analysis_key": f"{model_version()}|imgsz={IMGSZ}|{sampling}",
+    }
+
+
+def infer_batch(frames: list):
+    """
+    Прогоняет пачку кадров через модель одним вызовом.
+    При ошибке пачка пропускается (возвращается None).
+    """
+    try:
+        return get_engine()(frames)
+    except Exception:
+        log.exception("Inference failed for batch of %d frames", len(frames))
+        return None
+
+
+class LeaseLost(Exception):
+    """Аренду видео перехватила другая задача — продолжать обработку нельзя."""
+
+
+def acquire_lease(video_id: int, owner: str, seconds: float = LEASE_SECONDS) -> bool:
+    """
+    Берёт или продлевает аренду видео; False — видео обрабатывает другая задача
+    или DB-сервис недоступен (аренда не считается взятой).
+    """
+    try:
+        resp = db_client().post(f"/videos/{video_id}/lease", json={"owner": owner, "seconds": seconds})
+        resp.raise_for_status()
+    except httpx.HTTPError as exc:
+        log.warning("Failed to acquire lease for video %s: %s", video_id, exc)
+        return False
+    return resp.json()["acquired"]
+
+
+def release_lease(video_id: int, owner: str | None = None):
+    try:
+        db_client().delete(f"/videos/{video_id}/lease", params={"owner": owner} if owner else None)
+    except httpx.HTTPError as exc:
+        log.warning("Failed to release lease for video %s: %s", video_id, exc)
+
+
+class LeaseRenewer:
+    """
+    Продлевает аренду видео owner'ом; как колбэк прогресса FramePipeline —
+    не чаще раза в треть LEASE_SECONDS. Если аренду перехватила другая задача,
+    бросает LeaseLost: FramePipeline.run() передаёт исключение колбэка наружу,
+    и результат не сохраняется. Сбои связи с DB-сервисом только логируются.
+    """
+
+    def __init__(self, video_id: int, owner: str):
+        self.video_id = video_id
+        self.owner = owner
+        self._renewed = time.perf_counter()
+
+    def renew(self):
+        self._renewed = time.perf_counter()
+        try:
+            resp = db_client().post(f"/videos/{self.video_id}/lease",
+                                    json={"owner": self.owner, "seconds": LEASE_SECONDS})
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            log.warning("Failed to renew lease for video %s: %s", self.video_id, exc)
+            return
+        if not resp.json()["acquired"]:
+            raise LeaseLost(f"Video {self.video_id}: lease was taken over by another task")
+
+    def __call__(self, pipeline=None):
+        if time.perf_counter() - self._renewed >= LEASE_SECONDS / 3:
+            self.renew()
+
+
+def source_url(s3_url: str) -> str:
+    """
+    Ссылка, по которой воркер читает видео: сам s3_url или presigned-ссылка.
+    """
+    if not PRESIGN_SOURCE:
+        return s3_url
+    from s3.s3_client import presigned_url
+    return presigned_url(s3_url)
+
+
+class ProgressReporter:
+    """
+    Колбэк прогресса для FramePipeline: отправляет в DB-сервис
+    {"progress": {...}} — обработано кадров из общего числа, скорость
+    (кадров видео в секунду с прошлого отчёта), оценку оставшегося времени
+    и предварительные объекты. Если задан analysis_key, раз в CHECKPOINT_SECONDS
+    к отчёту добавляется {"checkpoint": {...}} (см. checkpoint), а с lease_owner
+    раз в треть LEASE_SECONDS продлевается аренда видео.
+    Ошибки записи только логируются.
+    """
+
+    def __init__(self, video_id: int, total_frames: int, analysis_key: str | None = None,
+                 lease_owner: str | None = None, start_frame: int = 0):
+        self.video_id = video_id
+        self.total_frames = total_frames
+        self.analysis_key = analysis_key
+        self.lease = LeaseRenewer(video_id, lease_owner) if lease_owner else None
+        self.aggregator = None
+        # Скорость считается от кадра, с которого началась (или продолжилась) обработка
+        self._last = (time.perf_counter(), start_frame)
+        self._checkpointed = time.perf_counter()
+
+    def snapshot(self, frames_done: int) -> dict:
+        now = time.perf_counter()
+        last_time, last_done = self._last
+        self._last = (now, frames_done)
+        fps = (frames_done - last_done) / (now - last_time) if now > last_time else 0.0
+        progress = {"frames_done": frames_done, "frames_total": self.total_frames, "fps": round(fps, 1)}
+        if self.total_frames > 0:
+            progress["percent"] = round(min(100.0, 100.0 * frames_done / self.total_frames), 1)
+            if fps > 0:
+                progress["eta_seconds"] = round(max(0, self.total_frames - frames_done) / fps)
+        if PROGRESS_LABELS and self.aggregator is not None:
+            top = sorted(self.aggregator.to_payloads(self.video_id), key=lambda p: -p["total_count"])
+            progress["labels"] = [
+                {"label": p["label"], "total_count": p["total_count"]} for p in top[:PROGRESS_LABELS]
+            ]
+        return progress
+
+    def checkpoint(self, pipeline: FramePipeline) -> dict:
+        """
+        Состояние для продолжения: агрегаты по кадрам до done_frame включительно
+        (снимок делается в потоке агрегации, поэтому они согласованы).
+        """
+        return {
+            "analysis_key": self.analysis_key,
+            "frame": pipeline.done_frame,
+            "second": round(pipeline.done_frame / pipeline.fps, 3),
+            "partial": self.aggregator.to_partial(),
+        }
+
+    def send(self, update: dict):
+        try:
+            db_client().put(f"/videos/{self.video_id}", json=update).raise_for_status()
+        except httpx.HTTPError as exc:
+            log.warning("Failed to report progress for video %s: %s", self.video_id, exc)
+
+    def __call__(self, pipeline: FramePipeline):
+        # done_frame — число кадров от начала видео (нумерация с 1)
+        update = {"progress": self.snapshot(pipeline.done_frame)}
+        now = time.perf_counter()
+        if self.analysis_key and CHECKPOINT_SECONDS and now - self._checkpointed >= CHECKPOINT_SECONDS:
+            self._checkpointed = now
+            update["checkpoint"] = self.checkpoint(pipeline)
+        # Аренда проверяется до записи, чтобы не затереть прогресс и checkpoint нового владельца
+        if self.lease is not None:
+            self.lease(pipeline)
+        self.send(update)
+
+
+def run_recognition(cap, mode: str, start_frame: int = 0, end_frame: int | None = None,
+                    progress=None, partial: dict | None = None):
+    """
+    Прогоняет кадры [start_frame, end_frame) открытого видео через конвейер.
+    progress — колбэк прогресса progress(pipeline), вызывается не чаще раза
+    в PROGRESS_SECONDS (ProgressReporter или LeaseRenewer),
+    partial — агрегаты уже обработанных кадров (продолжение с checkpoint).
+    Возвращает (aggregator, pipeline, stride).
+    """
+    aggregator = LabelAggregator(get_engine().names)
+    if partial:
+        aggregator.merge(partial)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stride = resolve_stride(mode, fps, FRAME_STRIDE, SAMPLE_FPS)
+    selector = SceneChangeSelector(SCENE_THRESHOLD) if mode == "scene" else None
+    pipeline = FramePipeline(
+        cap, infer_batch, aggregator.add_detections, fps=fps, stride=stride,
+        batch_size=BATCH_SIZE, selector=selector, queue_size=QUEUE_SIZE,
+        start_frame=start_frame, end_frame=end_frame,
+        progress=progress, progress_interval=PROGRESS_SECONDS,
+    )
+    if isinstance(progress, ProgressReporter):
+        progress.aggregator = aggregator
+    pipeline.run()
+    return aggregator, pipeline, stride
+
+
+def recognize_source(source: VideoSource, mode: str, start_frame: int = 0, end_frame: int | None = None,
+                     progress=None, partial: dict | None = None):
+    """
+    run_recognition для открытого VideoSource. Обрыв HTTP при потоковом чтении
+    выглядит для cv2 как конец видео, поэтому в режиме "stream" проверяется,
+    что чтение дошло до end_frame (или CAP_PROP_FRAME_COUNT); если нет —
+    обработка продолжается с последнего учтённого кадра по скачанному файлу.
+    """
+    aggregator, pipeline, stride = run_recognition(
+        source.cap, mode, start_frame, end_frame, progress=progress, partial=partial,
+    )
+    if source.mode != "stream":
+        return aggregator, pipeline, stride
+    expected = end_frame or int(source.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if expected <= 0 or expected - pipeline.last_frame <= stride + FRAME_COUNT_SLACK:
+        return aggregator, pipeline, stride
+
+    log.warning("Stream of %s stopped at frame %d of %d, continuing from downloaded file",
+                source.url, pipeline.last_frame, expected)
+    with VideoSource(source.url, stream=False) as fallback:
+        return run_recognition(
+            fallback.cap, mode, pipeline.done_frame, end_frame,
+            progress=progress, partial=aggregator.to_partial(),
+        )
+
+
+def save_results(video_id: int, aggregator: LabelAggregator, analysis: dict):
+    """
+    Записывает агрегированные данные в DB-сервис одной транзакцией
+    (замена VideoObject + статус "processed" и настройки анализа;
+    checkpoint при этом сбрасывается).
+    """
+    payload = {"status": "processed", **analysis, "objects": aggregator.to_payloads(video_id)}
+    resp = db_client().put(f"/videos/{video_id}/results", json=payload)
+    resp.raise_for_status()
+
+
+def resume_point(video_data: dict, analysis: dict, force: bool) -> tuple[int, dict | None]:
+    """
+    (start_frame, partial) из checkpoint прерванной обработки с теми же
+    моделью и настройками; иначе (0, None).
+    """
+    checkpoint = video_data.get("checkpoint")
+    if force or not checkpoint or checkpoint.get("analysis_key") != analysis["analysis_key"]:
+        return 0, None
+    return checkpoint["frame"], checkpoint["partial"]
+
+
+# acks_late + reject_on_worker_lost: если воркер убит посреди видео, брокер
+# доставит задачу снова, и она продолжит с последнего checkpoint
+# (id задачи при повторной доставке тот же, поэтому её аренда видео остаётся за ней)
+@celery_app.task(name=PROCESS_VIDEO_TASK, bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_video_task(self, video_id: int, sampling_mode: str | None = None, force: bool = False):
     """
     Задача для агрегированного распознавания объектов в видео,
     которая обращается к DB-сервису по HTTP API.
@@ -26,107 +371,208 @@ def process_video_task(video_id: int):
       - avg_confidence: средняя уверенность,
       - best_confidence: максимальная уверенность,
       - best_second: время (в секундах), когда наблюдалась максимальная уверенность.
+    sampling_mode переопределяет RECOGNITION_SAMPLING_MODE для этой задачи.
+    При выборке каждого k-го кадра счётчики умножаются на k.
+    Длинные видео (RECOGNITION_SEGMENT_MIN_SECONDS) делятся на отрезки,
+    которые обрабатываются параллельно, а результаты сливаются в chord.
+    Если видео уже обработано с теми же моделью и настройками (analysis_key),
+    сохранённый результат переиспользуется; force=True — пересчитать заново.
+    Прерванная обработка продолжается с checkpoint (см. RECOGNITION_CHECKPOINT_SECONDS);
+    при ошибке видео переводится в статус "error", checkpoint сохраняется.
+    Видео обрабатывает только задача, взявшая его аренду: повторная задача
+    для того же видео (например, при серии одинаковых загрузок) ничего не делает.
     """
+    owner = self.request.id or uuid.uuid4().hex
+    leased = False
     try:
+        mode = sampling_mode or SAMPLING_MODE
+        analysis = analysis_settings(mode)
+
         # 1. Получаем информацию о видео через DB-сервис
-        with httpx.Client() as client:
-            video_resp = client.get(f"{DB_SERVICE_URL}/videos/{video_id}")
-            if video_resp.status_code != 200:
-                return f"Video id={video_id} not found!"
-            video_data = video_resp.json()
-            
-            # Для обработки нам нужен s3_url
-            s3_url = video_data.get("s3_url")
-            if not s3_url:
-                client.put(f"{DB_SERVICE_URL}/videos/{video_id}", json={"status": "error"})
-                return f"No s3_url in DB for video id={video_id}!"
-            
-            # Обновляем статус видео на "processing"
-            client.put(f"{DB_SERVICE_URL}/videos/{video_id}", json={"status": "processing"})
-        
-        # 2. Скачиваем видео из S3 во временный файл
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmpfile:
-            response = requests.get(s3_url, stream=True)
-            if response.status_code != 200:
-                with httpx.Client() as client:
-                    client.put(f"{DB_SERVICE_URL}/videos/{video_id}", json={"status": "error"})
-                return f"Error downloading {s3_url}"
-            for chunk in response.iter_content(chunk_size=8192):
-                tmpfile.write(chunk)
-            tmp_path = tmpfile.name
-
-        # 3. Обрабатываем видео: собираем агрегированную статистику
-        counts = {}      # {label: count}
-        sum_conf = {}    # {label: cumulative confidence}
-        best_conf = {}   # {label: maximum confidence}
-        best_sec = {}    # {label: second when max confidence recorded}
-
-        cap = cv2.VideoCapture(tmp_path)
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-        frame_index = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frame_index += 1
-
-            try:
-                results = model(frame)
-            except Exception:
-                continue
-            if not results or len(results) == 0:
-                continue
-
-            r = results[0]
-            boxes = r.boxes
-            if boxes is None or len(boxes) == 0:
-                continue
-
-            for i in range(len(boxes)):
-                try:
-                    conf = float(boxes.conf[i])
-                    cls_id = int(boxes.cls[i])
-                    label = r.names[cls_id]
-                except Exception:
-                    continue
-
-                counts[label] = counts.get(label, 0) + 1
-                sum_conf[label] = sum_conf.get(label, 0.0) + conf
-                if label not in best_conf or conf > best_conf[label]:
-                    best_conf[label] = conf
-                    best_sec[label] = frame_index / fps
-
-        cap.release()
-        os.remove(tmp_path)  # Очистим временный файл
-
-        if not counts:
-            # Если объекты не обнаружены, обновляем статус и выходим
-            with httpx.Client() as client:
-                client.put(f"{DB_SERVICE_URL}/videos/{video_id}", json={"status": "processed"})
-            return f"Video {video_id} processed successfully, but no objects detected."
+        client = db_client()
+        def fetch_video() -> dict | None:
+            video_resp = client.get(f"/videos/{video_id}")
+            return video_resp.json() if video_resp.status_code == 200 else None
+
+        def reusable(video_data: dict) -> bool:
+            return (not force and video_data.get("status") == "processed"
+                    and video_data.get("analysis_key") == analysis["analysis_key"])
+
+        video_data = fetch_video()
+        if video_data is None:
+            return f"Video id={video_id} not found!"
+        if reusable(video_data):
+            return f"Video {video_id} is already processed with {analysis['analysis_key']}, result reused."
+
+        leased = acquire_lease(video_id, owner)
+        if not leased:
+            return f"Video {video_id} is already being processed by another task, skipped."
+        # Перечитываем под арендой: предыдущий владелец мог успеть сохранить
+        # результат (и сбросить checkpoint), пока мы ждали
+        video_data = fetch_video()
+        if video_data is None:
+            return f"Video id={video_id} not found!"
+        if reusable(video_data):
+            return f"Video {video_id} is already processed with {analysis['analysis_key']}, result reused."
+
+        # Для обработки нам нужен s3_url
+        s3_url = video_data.get("s3_url")
+        if not s3_url:
+            client.put(f"/videos/{video_id}", json={"status": "error"})
+            return f"No s3_url in DB for video id={video_id}!"
+
+        # Обновляем статус видео на "processing"
+        client.put(f"/videos/{video_id}", json={"status": "processing"})
+
+        # 2-3. Открываем видео из S3 (потоково или через временный файл)
+        #      и собираем агрегированную статистику
+        segments = None
+        try:
+            with VideoSource(source_url(s3_url), stream=STREAM_DECODE) as source:
+                cap = source.cap
+                fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                if (SEGMENT_MIN_SECONDS and celery_app.conf.result_backend
+                        and total_frames / fps > SEGMENT_MIN_SECONDS):
+                    stride = resolve_stride(mode, fps, FRAME_STRIDE, SAMPLE_FPS)
+                    segments = split_segments(total_frames, int(SEGMENT_SECONDS * fps), stride)
+                else:
+                    start_frame, partial = resume_point(video_data, analysis, force)
+                    if start_frame:
+                        log.info("Video %s: resuming from checkpoint at frame %d of %d",
+                                 video_id, start_frame, total_frames)
+                    progress = ProgressReporter(
+                        video_id, total_frames, analysis["analysis_key"], owner, start_frame,
+                    )
+                    progress.send({"progress": progress.snapshot(start_frame)})
+                    aggregator, pipeline, stride = recognize_source(
+                        source, mode, start_frame, progress=progress, partial=partial,
+                    )
+        except SourceError:
+            db_client().put(f"/videos/{video_id}", json={"status": "error"})
+            return f"Error downloading {s3_url}"
 
-        # 4. Обновляем агрегированные данные через DB-сервис:
-        with httpx.Client() as client:
-            # Сначала удаляем старые агрегированные записи для этого видео
-            client.delete(f"{DB_SERVICE_URL}/videos/{video_id}/objects")
-
-            # Затем для каждого label создаем новую запись
-            for label, total_count in counts.items():
-                avg_conf = sum_conf[label] / total_count
-                payload = {
-                    "video_id": video_id,
-                    "label": label,
-                    "total_count": total_count,
-                    "avg_confidence": avg_conf,
-                    "best_confidence": best_conf[label],
-                    "best_second": best_sec[label]
-                }
-                post_resp = client.post(f"{DB_SERVICE_URL}/videos/{video_id}/objects", json=payload)
-                # Можно добавить проверку post_resp.status_code
-
-            # Обновляем статус видео на "processed"
-            client.put(f"{DB_SERVICE_URL}/videos/{video_id}", json={"status": "processed"})
-
-        return f"Video {video_id} processed successfully with {len(counts)} labels."
+        analysis["frame_stride"] = stride
+
+        if segments:
+            # Длинное видео: отрезки обрабатываются параллельно, итог собирает merge_video_segments_task.
+            # Аренда переходит к отрезкам: она выдаётся с запасом на ожидание отрезков
+            # в очереди (по LEASE_SECONDS на отрезок), отрезки продлевают её во время
+            # обработки, а снимают merge / mark_video_error
+            if not acquire_lease(video_id, owner, LEASE_SECONDS * len(segments)):
+                leased = False
+                return f"Video {video_id}: lease was taken over by another task, skipped."
+            ProgressReporter(video_id, total_frames).send({"progress": {
+                "frames_done": 0, "frames_total": total_frames, "percent": 0.0,
+                "segments_done": 0, "segments_total": len(segments),
+            }})
+            callback = merge_video_segments_task.s(video_id, analysis, owner)
+            callback.on_error(mark_video_error_task.si(video_id, owner))
+            chord(
+                process_video_segment_task.s(video_id, s3_url, start, end, mode, owner)
+                for start, end in segments
+            )(callback)
+            leased = False
+            return f"Video {video_id} split into {len(segments)} segments."
+
+        skipped = pipeline.skipped
+        throughput = pipeline.throughput
+        log.info(
+            "Video %s: source=%s, download %.1f s, processing %d of %d frames in %.1f s "
+            "(%.1f frames/s, batch=%d, mode=%s, stride=%d, skipped inferences=%d)",
+            video_id, source.mode, source.download_seconds, pipeline.processed, pipeline.last_frame,
+            pipeline.elapsed, throughput, BATCH_SIZE, mode, stride, skipped,
+        )
+
+        # 4. Обновляем агрегированные данные через DB-сервис
+        save_results(video_id, aggregator, analysis)
+
+        if not aggregator:
+            return f"Video {video_id} processed successfully, but no objects detected."
+        return (
+            f"Video {video_id} processed successfully with {len(aggregator)} labels "
+            f"(download {source.download_seconds:.1f} s, processing {pipeline.elapsed:.1f} s, "
+            f"{throughput:.1f} frames/s, {skipped} inferences skipped)."
+        )
+    except LeaseLost as e:
+        # Видео обрабатывает другая задача: не сохраняем результат, не трогаем
+        # статус и не снимаем чужую аренду
+        leased = False
+        log.warning("%s", e)
+        return f"{e}, stopped."
     except Exception as e:
+        log.exception("Processing video %s failed", video_id)
+        try:
+            db_client().put(f"/videos/{video_id}", json={"status": "error"})
+        except httpx.HTTPError:
+            log.warning("Failed to mark video %s as error", video_id)
         return f"Error processing video {video_id}: {str(e)}"
+    finally:
+        if leased:
+            release_lease(video_id, owner)
+
+
+@celery_app.task(name=PROCESS_VIDEO_SEGMENT_TASK, acks_late=True, reject_on_worker_lost=True)
+def process_video_segment_task(video_id: int, s3_url: str, start_frame: int, end_frame: int,
+                               sampling_mode: str, lease_owner: str | None = None):
+    """
+    Обрабатывает отрезок видео [start_frame, end_frame) и возвращает
+    частичные агрегаты (LabelAggregator.to_partial) для слияния.
+    Ошибки не перехватываются, чтобы chord не слил неполные данные.
+    lease_owner — аренда видео, взятая process_video_task (продлевается в начале
+    отрезка и во время его обработки; при перехвате — LeaseLost).
+    Готовый отрезок засчитывается в прогресс видео (segments_done из segments_total).
+    """
+    lease = LeaseRenewer(video_id, lease_owner) if lease_owner else None
+    if lease is not None:
+        lease.renew()
+    # При потоковом чтении FFmpeg перематывает к началу отрезка Range-запросами
+    with VideoSource(source_url(s3_url), stream=STREAM_DECODE) as source:
+        aggregator, pipeline, _ = recognize_source(
+            source, sampling_mode, start_frame, end_frame, progress=lease,
+        )
+
+    log.info(
+        "Video %s segment [%d, %d): source=%s, download %.1f s, %d frames in %.1f s (%.1f frames/s)",
+        video_id, start_frame, end_frame, source.mode, source.download_seconds,
+        pipeline.processed, pipeline.elapsed, pipeline.throughput,
+    )
+    try:
+        db_client().post(f"/videos/{video_id}/progress/segments",
+                         json={"frames": end_frame - start_frame}).raise_for_status()
+    except httpx.HTTPError as exc:
+        log.warning("Failed to report segment progress for video %s: %s", video_id, exc)
+    return aggregator.to_partial()
+
+
+@celery_app.task(name=MERGE_VIDEO_SEGMENTS_TASK)
+def merge_video_segments_task(partials: list, video_id: int, analysis: dict,
+                              lease_owner: str | None = None):
+    """
+    Сливает частичные агрегаты отрезков, сохраняет итог в DB-сервис и снимает аренду видео.
+    Если аренда уже у другой задачи, итог не сохраняется.
+    """
+    if lease_owner and not acquire_lease(video_id, lease_owner):
+        return f"Video {video_id}: lease was taken over by another task, segments discarded."
+    aggregator = LabelAggregator()
+    for partial in partials:
+        aggregator.merge(partial)
+    save_results(video_id, aggregator, analysis)
+    if lease_owner:
+        release_lease(video_id, lease_owner)
+    return f"Video {video_id} processed successfully with {len(aggregator)} labels ({len(partials)} segments)."
+
+
+@celery_app.task(name=MARK_VIDEO_ERROR_TASK)
+def mark_video_error_task(video_id: int, lease_owner: str | None = None):
+    """
+    Переводит видео в статус "error" и снимает аренду (errback для chord отрезков).
+    Если аренда уже у другой задачи (в том числе отрезок упал с LeaseLost),
+    статус не меняется.
+    """
+    if lease_owner and not acquire_lease(video_id, lease_owner):
+        return f"Video {video_id}: lease was taken over by another task, status left as is."
+    db_client().put(f"/videos/{video_id}", json={"status": "error"})
+    if lease_owner:
+        release_lease(video_id, lease_owner)
+    return f"Video {video_id} marked as error."
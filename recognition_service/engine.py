@@ -0,0 +1,212 @@
+# recognition_service/engine.py
+"""
+Движки распознавания для CPU: одна и та же модель YOLO через
+  - "torch"    — ultralytics / PyTorch (как раньше),
+  - "onnx"     — экспорт в ONNX и ONNX Runtime,
+  - "openvino" — экспорт в OpenVINO IR и OpenVINO Runtime.
+Любой движок вызывается как engine(frames) и возвращает для каждого кадра
+Detections(cls_ids, confs) — ровно то, что нужно LabelAggregator.
+"""
+import ast
+import hashlib
+import os
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from decouple import config
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+BACKEND = config("RECOGNITION_BACKEND", default="torch")
+# Число потоков инференции (0 — на усмотрение рантайма)
+THREADS = config("RECOGNITION_THREADS", default=0, cast=int)
+# Размер входа сети (сторона квадрата после letterbox)
+IMGSZ = config("RECOGNITION_IMGSZ", default=640, cast=int)
+
+# Пороги как у ultralytics по умолчанию, чтобы результаты бэкендов совпадали
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7
+MAX_DET = 300
+
+
+class Detections(NamedTuple):
+    cls_ids: np.ndarray  # int, shape (n,)
+    confs: np.ndarray    # float, shape (n,)
+
+
+class TorchEngine:
+    """
+    Модель ultralytics YOLO на PyTorch (CPU).
+    """
+
+    def __init__(self, model_path: str, imgsz: int = IMGSZ, threads: int = THREADS):
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.imgsz = imgsz
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+        # Файл весов, который реально загружен (ultralytics мог его скачать)
+        self.path = getattr(self.model, "ckpt_path", None) or model_path
+
+    def __call__(self, frames: list) -> list[Detections]:
+        results = self.model(frames, imgsz=self.imgsz, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                             max_det=MAX_DET, device="cpu", verbose=False)
+        return [
+            Detections(r.boxes.cls.cpu().numpy().astype(np.intp), r.boxes.conf.cpu().numpy())
+            for r in results
+        ]
+
+
+class _ExportedEngine:
+    """
+    Общие пред- и постобработка для экспортированной модели YOLO:
+    вход — NCHW float32 RGB 0..1 после letterbox, выход — (batch, 4 + nc, anchors).
+    """
+    names: dict
+
+    def __init__(self, imgsz: int):
+        self.imgsz = imgsz
+
+    def _letterbox(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = round(w * scale), round(h * scale)
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        top, left = (self.imgsz - new_h) // 2, (self.imgsz - new_w) // 2
+        canvas[top:top + new_h, left:left + new_w] = resized
+        return canvas
+
+    def preprocess(self, frames: list) -> np.ndarray:
+        batch = np.stack([self._letterbox(frame) for frame in frames])
+        batch = batch[..., ::-1].transpose(0, 3, 1, 2)  # BGR -> RGB, NHWC -> NCHW
+        return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+    @staticmethod
+    def postprocess(output: np.ndarray) -> list[Detections]:
+        detections = []
+        for pred in output:
+            pred = pred.T                      # (anchors, 4 + nc)
+            scores = pred[:, 4:]
+            cls_ids = scores.argmax(axis=1)
+            confs = scores[np.arange(len(cls_ids)), cls_ids]
+            keep = confs > CONF_THRESHOLD
+            boxes, cls_ids, confs = pred[keep, :4], cls_ids[keep], confs[keep]
+            if len(confs) == 0:
+                detections.append(Detections(np.empty(0, np.intp), np.empty(0, np.float32)))
+                continue
+
+            # xywh (центр) -> xywh (левый верхний угол) для NMS по классам
+            boxes = boxes.copy()
+            boxes[:, :2] -= boxes[:, 2:] / 2
+            idx = cv2.dnn.NMSBoxesBatched(
+                boxes.tolist(), confs.tolist(), cls_ids.tolist(), CONF_THRESHOLD, IOU_THRESHOLD,
+            )
+            idx = np.asarray(idx, dtype=np.intp).reshape(-1)[:MAX_DET]
+            detections.append(Detections(cls_ids[idx].astype(np.intp), confs[idx]))
+        return detections
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def __call__(self, frames: list) -> list[Detections]:
+        return self.postprocess(self.run(self.preprocess(frames)))
+
+
+class OnnxEngine(_ExportedEngine):
+    """
+    Экспортированная в ONNX модель на ONNX Runtime (CPUExecutionProvider).
+    """
+
+    def __init__(self, model_path: str, imgsz: int = IMGSZ, threads: int = THREADS):
+        import onnxruntime as ort
+
+        super().__init__(imgsz)
+        self.path = model_path
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # ultralytics кладёт словарь классов в метаданные модели
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"])
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoEngine(_ExportedEngine):
+    """
+    Экспортированная в OpenVINO IR модель на OpenVINO Runtime (CPU).
+    """
+
+    def __init__(self, model_path: str, imgsz: int = IMGSZ, threads: int = THREADS):
+        import yaml
+        import openvino as ov
+
+        super().__init__(imgsz)
+        self.path = model_path
+        xml = next(f for f in os.listdir(model_path) if f.endswith(".xml"))
+        core = ov.Core()
+        properties = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+        self.model = core.compile_model(core.read_model(os.path.join(model_path, xml)), "CPU", properties)
+        self.output = self.model.output(0)
+        with open(os.path.join(model_path, "metadata.yaml")) as f:
+            self.names = yaml.safe_load(f)["names"]
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        return self.model(blob)[self.output]
+
+
+def artifact_digest(path: str) -> str:
+    """
+    sha256 содержимого модели: файла весов или каталога экспорта (все файлы по порядку имён).
+    """
+    digest = hashlib.sha256()
+    files = [path] if os.path.isfile(path) else [
+        os.path.join(root, name)
+        for root, _, names in sorted(os.walk(path)) for name in sorted(names)
+    ]
+    for file in files:
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_model(model_path: str, backend: str, imgsz: int = IMGSZ) -> str:
+    """
+    Возвращает путь к модели для бэкенда; при необходимости экспортирует .pt
+    через ultralytics (с динамическим batch) рядом с исходным файлом.
+    """
+    stem, ext = os.path.splitext(model_path)
+    if backend == "torch" or (backend == "onnx" and ext == ".onnx") or os.path.isdir(model_path):
+        return model_path
+
+    target = f"{stem}.onnx" if backend == "onnx" else f"{stem}_openvino_model"
+    if not os.path.exists(target):
+        from ultralytics import YOLO
+        target = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True)
+    return target
+
+
+def create_engine(model_path: str, backend: str = BACKEND, imgsz: int = IMGSZ, threads: int = THREADS):
+    """
+    Создаёт движок распознавания выбранного бэкенда (см. BACKENDS).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown recognition backend: {backend}")
+    path = export_model(model_path, backend, imgsz)
+    if backend == "onnx":
+        engine = OnnxEngine(path, imgsz, threads)
+    elif backend == "openvino":
+        engine = OpenVinoEngine(path, imgsz, threads)
+    else:
+        engine = TorchEngine(path, imgsz, threads)
+    engine.backend = backend
+    return engine
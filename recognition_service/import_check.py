@@ -0,0 +1,46 @@
+# recognition_service/import_check.py
+"""
+Проверка, что процессы-продюсеры не загружают тяжёлые зависимости воркера.
+
+    python -m recognition_service.import_check web_api.app src.bot.handlers.video
+
+Каждый модуль импортируется в отдельном интерпретаторе; печатаются время импорта,
+пиковый RSS и загруженные тяжёлые модули. Код возврата 1, если загружен torch / ultralytics.
+"""
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "ultralytics", "recognition_service.detect")
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print(json.dumps({"seconds": elapsed, "rss_mb": rss_kb / 1024, "heavy": heavy}))
+"""
+
+
+def probe(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, module, json.dumps(HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(modules: list[str]) -> int:
+    failed = False
+    for module in modules or ["web_api.app"]:
+        result = probe(module)
+        heavy = ", ".join(result["heavy"]) or "-"
+        print(f"{module}: import {result['seconds']:.2f} s, RSS {result['rss_mb']:.0f} MB, heavy: {heavy}")
+        failed = failed or bool(result["heavy"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
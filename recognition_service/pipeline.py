@@ -0,0 +1,217 @@
+# recognition_service/pipeline.py
+import time
+import queue
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from recognition_service.sampling import iter_sampled_frames
+
+log = logging.getLogger(__name__)
+
+# Маркер конца потока между стадиями
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Конвейер остановлен (ошибка в другой стадии)."""
+
+
+class FramePipeline:
+    """
+    Конвейер распознавания из трёх стадий, связанных ограниченными очередями:
+      1. декодер (отдельный поток) — читает кадры [start_frame, end_frame)
+         в переиспользуемые буферы через cap.read(image=...), пропускает кадры
+         через grab() и, если задан selector, отбрасывает кадры без смены сцены;
+      2. инференция (отдельный поток) — собирает кадры в пачки по batch_size
+         и вызывает infer(frames) -> list[Results] | None;
+      3. агрегация (вызывающий поток) — aggregate(r, second, weight) для каждого кадра.
+    progress(pipeline), если задан, вызывается из потока агрегации не чаще
+    раза в progress_interval секунд; done_frame — номер последнего кадра,
+    уже учтённого агрегацией (вместе с пропущенными после него кадрами).
+    Заполненные очереди тормозят предыдущую стадию (backpressure), а ошибка
+    в любой стадии останавливает остальные и пробрасывается из run().
+    Буферы кадров выделяются по мере надобности (не больше queue_size + batch_size + 1)
+    и возвращаются в пул сразу после инференции, поэтому в aggregate
+    нельзя полагаться на r.orig_img.
+    """
+
+    def __init__(self, cap, infer, aggregate, fps: float, stride: int = 1,
+                 batch_size: int = 16, selector=None, queue_size: int = 32,
+                 start_frame: int = 0, end_frame: int | None = None,
+                 progress=None, progress_interval: float = 5.0):
+        self.cap = cap
+        self.infer = infer
+        self.aggregate = aggregate
+        self.fps = fps
+        self.stride = stride
+        self.batch_size = batch_size
+        self.selector = selector
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+        self.processed = 0     # декодировано (выбрано) кадров
+        self.last_frame = start_frame  # номер последнего прочитанного кадра
+        self.done_frame = start_frame  # номер последнего кадра, учтённого агрегацией
+        self.elapsed = 0.0
+
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._results = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+
+        # Пул буферов: очередь кадров + собираемая пачка + кадр в декодере.
+        # Буферы выделяются лениво: если инференция успевает за декодером,
+        # в ходу остаётся лишь несколько кадров, а не весь предел
+        self._free = queue.Queue()
+        self._buffers = 0
+        self._max_buffers = queue_size + batch_size + 1
+        self._width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self._height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    @property
+    def skipped(self) -> int:
+        return self.selector.skipped if self.selector is not None else 0
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    # ---------- очереди с учётом остановки -----------------------------------
+    def _put(self, q: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Stopped()
+
+    def _next_buffer(self):
+        # Вызывается только из потока декодера
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        if self._buffers < self._max_buffers:
+            self._buffers += 1
+            # При неизвестном размере буфер выделит сам cap.read и он попадёт в пул
+            if self._width and self._height:
+                return np.empty((self._height, self._width, 3), np.uint8)
+            return None
+        return self._get(self._free)
+
+    def _fail(self, exc: Exception):
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    # ---------- стадии --------------------------------------------------------
+    def _decode(self):
+        try:
+            frames = iter_sampled_frames(
+                self.cap, self.stride, next_buffer=self._next_buffer,
+                start_frame=self.start_frame, end_frame=self.end_frame,
+            )
+            for frame_index, frame in frames:
+                self.last_frame = frame_index
+                self.processed += 1
+                if self.selector is not None and not self.selector.is_changed(frame):
+                    # Сцена не изменилась — кадр засчитывается детекциям предыдущего
+                    self._free.put(frame)
+                    self._put(self._frames, (None, None, self.stride, frame_index))
+                    continue
+                self._put(self._frames, (frame, frame_index / self.fps, self.stride, frame_index))
+            self._put(self._frames, _DONE)
+        except _Stopped:
+            pass
+        except Exception as exc:
+            log.exception("Frame decoding failed")
+            self._fail(exc)
+
+    def _infer_batch(self, batch: list):
+        frames = [item[0] for item in batch]
+        results = self.infer(frames)
+        for frame in frames:
+            self._free.put(frame)
+        if results is None:
+            return
+        for r, (_, second, weight, frame_index) in zip(results, batch):
+            self._put(self._results, (r, second, weight, frame_index))
+
+    def _inference(self):
+        try:
+            batch = []
+            while True:
+                item = self._get(self._frames)
+                if item is _DONE:
+                    break
+                frame, second, weight, frame_index = item
+                if frame is None:
+                    # Пачка сбрасывается только перед новым кадром, поэтому
+                    # последний кадр ещё в ней и может получить дополнительный вес
+                    batch[-1][2] += weight
+                    batch[-1][3] = frame_index
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._infer_batch(batch)
+                    batch = []
+                batch.append([frame, second, weight, frame_index])
+            if batch:
+                self._infer_batch(batch)
+            self._put(self._results, _DONE)
+        except _Stopped:
+            pass
+        except Exception as exc:
+            log.exception("Inference stage failed")
+            self._fail(exc)
+
+    def run(self):
+        """
+        Запускает конвейер и агрегирует результаты в текущем потоке до конца видео.
+        """
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._decode, name="pipeline-decode", daemon=True),
+            threading.Thread(target=self._inference, name="pipeline-infer", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        reported = started
+        try:
+            while True:
+                item = self._get(self._results)
+                if item is _DONE:
+                    break
+                r, second, weight, self.done_frame = item
+                self.aggregate(r, second, weight)
+                if self.progress is not None:
+                    now = time.perf_counter()
+                    if now - reported >= self.progress_interval:
+                        reported = now
+                        self.elapsed = now - started
+                        self.progress(self)
+        except _Stopped:
+            pass
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            self.elapsed = time.perf_counter() - started
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,96 @@
+# recognition_service/sampling.py
+import cv2
+import numpy as np
+
+# "all"    — обрабатывается каждый кадр,
+# "stride" — каждый k-й кадр,
+# "fps"    — N кадров в секунду видео,
+# "scene"  — каждый кадр, но модель запускается только при смене сцены.
+SAMPLING_MODES = ("all", "stride", "fps", "scene")
+
+
+def resolve_stride(mode: str, fps: float, frame_stride: int = 1, sample_fps: float = 1.0) -> int:
+    """
+    Возвращает шаг выборки кадров (1 — каждый кадр) для выбранного режима.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {mode}")
+    if mode == "stride":
+        return max(1, int(frame_stride))
+    if mode == "fps" and sample_fps > 0:
+        return max(1, round(fps / sample_fps))
+    return 1
+
+
+def split_segments(total_frames: int, segment_frames: int, stride: int = 1) -> list[tuple[int, int]]:
+    """
+    Делит видео на отрезки [start, end) по segment_frames кадров.
+    Длина отрезка кратна шагу выборки, чтобы отрезки выбирали те же кадры, что и целое видео.
+    """
+    segment_frames = max(stride, segment_frames // stride * stride)
+    return [
+        (start, min(start + segment_frames, total_frames))
+        for start in range(0, total_frames, segment_frames)
+    ]
+
+
+def iter_sampled_frames(cap, stride: int = 1, next_buffer=None,
+                        start_frame: int = 0, end_frame: int | None = None):
+    """
+    Генератор (frame_index, frame) по каждому stride-му кадру (нумерация с 1).
+    Пропущенные кадры читаются через cap.grab(), поэтому не декодируются полностью.
+    next_buffer — необязательная функция, возвращающая массив, в который
+    декодируется очередной кадр (cap.read(image=...)), чтобы не выделять память на каждый кадр.
+    start_frame / end_frame ограничивают отрезок [start_frame, end_frame) (с перемоткой к началу).
+    """
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frame_index = start_frame
+    while end_frame is None or frame_index < end_frame:
+        if frame_index % stride:
+            if not cap.grab():
+                break
+            frame_index += 1
+            continue
+
+        if next_buffer is not None:
+            ret, frame = cap.read(image=next_buffer())
+        else:
+            ret, frame = cap.read()
+        if not ret:
+            break
+        frame_index += 1
+        yield frame_index, frame
+
+
+class SceneChangeSelector:
+    """
+    Адаптивный выбор кадров для инференции.
+    Кадр уменьшается до size x size в оттенках серого и сравнивается
+    (средняя абсолютная разница, 0..255) с последним кадром, на котором запускалась модель.
+    Если разница не превышает threshold, детекции предыдущего кадра переиспользуются.
+    """
+
+    def __init__(self, threshold: float = 6.0, size: int = 64):
+        self.threshold = threshold
+        self.size = size
+        self.skipped = 0
+        self._reference = None
+
+    def _signature(self, frame) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return small.astype(np.int16)
+
+    def is_changed(self, frame) -> bool:
+        """
+        True — кадр нужно прогнать через модель, False — можно переиспользовать детекции.
+        """
+        signature = self._signature(frame)
+        if self._reference is not None:
+            diff = np.abs(signature - self._reference).mean()
+            if diff <= self.threshold:
+                self.skipped += 1
+                return False
+        self._reference = signature
+        return True
@@ -0,0 +1,130 @@
+# recognition_service/source.py
+import os
+import time
+import logging
+import tempfile
+
+import cv2
+import requests
+
+log = logging.getLogger(__name__)
+
+# Сколько байт начала файла читать, чтобы найти moov / mdat
+PROBE_BYTES = 64 * 1024
+# Максимум Range-запросов при обходе верхнеуровневых атомов MP4
+PROBE_MAX_ATOMS = 16
+
+
+class SourceError(Exception):
+    """Видео не удалось ни открыть потоково, ни скачать."""
+
+
+def _read_range(url: str, start: int, length: int) -> bytes:
+    resp = requests.get(url, headers={"Range": f"bytes={start}-{start + length - 1}"}, timeout=30)
+    if resp.status_code == 200:
+        # Сервер игнорирует Range — потоковое чтение с перемоткой невозможно
+        raise SourceError("Range requests are not supported")
+    if resp.status_code != 206:
+        raise SourceError(f"HTTP {resp.status_code}")
+    return resp.content
+
+
+def is_streamable(url: str) -> bool:
+    """
+    Проверяет, можно ли декодировать MP4 по мере скачивания: обходит верхнеуровневые
+    атомы через Range-запросы и возвращает True, если moov встречается раньше mdat.
+    Для не-MP4 контейнеров (нет ftyp) возвращает True — их FFmpeg читает последовательно.
+    """
+    data = _read_range(url, 0, PROBE_BYTES)
+    if data[4:8] != b"ftyp":
+        return True
+
+    offset, base = 0, 0  # offset — абсолютное смещение атома, base — смещение data в файле
+    for _ in range(PROBE_MAX_ATOMS):
+        if offset + 16 > base + len(data):
+            base, data = offset, _read_range(url, offset, 16)
+            if len(data) < 8:
+                return False
+        header = data[offset - base:offset - base + 16]
+        size = int.from_bytes(header[:4], "big")
+        kind = header[4:8]
+        if kind == b"moov":
+            return True
+        if kind == b"mdat" or size == 0:
+            return False
+        if size == 1:
+            size = int.from_bytes(header[8:16], "big")
+        offset += size
+    return False
+
+
+def download_video(url: str) -> str | None:
+    """
+    Скачивает видео во временный файл и возвращает путь к нему (None при ошибке).
+    """
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmpfile:
+        response = requests.get(url, stream=True)
+        if response.status_code == 200:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                tmpfile.write(chunk)
+            return tmpfile.name
+    os.remove(tmpfile.name)
+    return None
+
+
+class VideoSource:
+    """
+    Открывает видео по URL для cv2:
+      - "stream" — FFmpeg читает HTTP(S) напрямую, декодирование начинается
+        до окончания скачивания (если контейнер это позволяет),
+      - "file"   — запасной путь: полное скачивание во временный файл
+        (MP4 с moov в конце, сервер без Range, ошибка открытия потока).
+    download_seconds — время скачивания (для "stream" — время проверки и открытия).
+
+        with VideoSource(url) as source:
+            run(source.cap)
+    """
+
+    def __init__(self, url: str, stream: bool = True):
+        self.url = url
+        self.stream = stream
+        self.mode = None
+        self.cap = None
+        self.download_seconds = 0.0
+        self._tmp_path = None
+
+    def _open_stream(self):
+        try:
+            if not is_streamable(self.url):
+                log.info("Moov atom is at the end of %s, falling back to download", self.url)
+                return None
+        except (SourceError, requests.RequestException) as exc:
+            log.info("Cannot probe %s (%s), falling back to download", self.url, exc)
+            return None
+        cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def __enter__(self):
+        started = time.perf_counter()
+        cap = self._open_stream() if self.stream else None
+        if cap is not None:
+            self.mode = "stream"
+        else:
+            self._tmp_path = download_video(self.url)
+            if self._tmp_path is None:
+                raise SourceError(f"Error downloading {self.url}")
+            cap = cv2.VideoCapture(self._tmp_path)
+            self.mode = "file"
+        self.cap = cap
+        self.download_seconds = time.perf_counter() - started
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.cap is not None:
+            self.cap.release()
+        if self._tmp_path is not None:
+            os.remove(self._tmp_path)  # Очистим временный файл
+        return False
@@ -1,5 +1,7 @@
 # src/s3/s3_client.py
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from decouple import config
 
 AWS_ACCESS_KEY = config("AWS_ACCESS_KEY")
@@ -7,11 +9,26 @@ AWS_SECRET_KEY = config("AWS_SECRET_KEY")
 AWS_ENDPOINT_URL = config("AWS_ENDPOINT_URL")  # например, "https://storage.yandexcloud.net"
 S3_BUCKET = config("S3_BUCKET")
 
+# Настройки передачи: с какого размера включается multipart, размер части,
+# число параллельных частей одной передачи и размер пула HTTP-соединений клиента
+S3_MULTIPART_THRESHOLD = config("S3_MULTIPART_THRESHOLD", default=8 * 1024 * 1024, cast=int)
+S3_PART_SIZE = config("S3_PART_SIZE", default=8 * 1024 * 1024, cast=int)
+S3_MAX_CONCURRENCY = config("S3_MAX_CONCURRENCY", default=4, cast=int)
+S3_MAX_POOL_CONNECTIONS = config("S3_MAX_POOL_CONNECTIONS", default=32, cast=int)
+
+# Один клиент на процесс: соединения переиспользуются (keep-alive) всеми вызовами
 s3_client = boto3.client(
     "s3",
     aws_access_key_id=AWS_ACCESS_KEY,
     aws_secret_access_key=AWS_SECRET_KEY,
-    endpoint_url=AWS_ENDPOINT_URL  # важно для Yandex Cloud
+    endpoint_url=AWS_ENDPOINT_URL,  # важно для Yandex Cloud
+    config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS, retries={"mode": "standard"}),
+)
+
+transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY,
 )
 
 def upload_fileobj(fileobj, key: str) -> str:
@@ -19,6 +36,84 @@ def upload_fileobj(fileobj, key: str) -> str:
     Загрузка файла (fileobj — любой файловый-like объект) в S3 под указанным ключом.
     Возвращает публичный URL (если бакет публичен) или https-ссылку.
     """
-    s3_client.upload_fileobj(fileobj, S3_BUCKET, key)
+    s3_client.upload_fileobj(fileobj, S3_BUCKET, key, Config=transfer_config)
     # Формируем URL объекта
+    return object_url(key)
+
+
+def object_url(key: str) -> str:
     return f"{AWS_ENDPOINT_URL}/{S3_BUCKET}/{key}"
+
+
+def key_from_url(s3_url: str) -> str:
+    """
+    Ключ объекта по URL вида, который возвращает object_url.
+    """
+    return s3_url.split(f"/{S3_BUCKET}/", 1)[-1]
+
+
+def upload_file(path: str, key: str) -> str:
+    s3_client.upload_file(path, S3_BUCKET, key, Config=transfer_config)
+    return object_url(key)
+
+
+def download_file(key: str, path: str):
+    s3_client.download_file(S3_BUCKET, key, path, Config=transfer_config)
+
+
+def create_multipart_upload(key: str) -> str:
+    """
+    Начинает multipart-загрузку и возвращает её UploadId.
+    """
+    resp = s3_client.create_multipart_upload(Bucket=S3_BUCKET, Key=key)
+    return resp["UploadId"]
+
+
+def upload_part(key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+    """
+    Загружает одну часть (все, кроме последней, — не меньше 5 МиБ).
+    Возвращает описание части для complete_multipart_upload.
+    """
+    resp = s3_client.upload_part(
+        Bucket=S3_BUCKET, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+    )
+    return {"PartNumber": part_number, "ETag": resp["ETag"]}
+
+
+def complete_multipart_upload(key: str, upload_id: str, parts: list[dict]) -> str:
+    s3_client.complete_multipart_upload(
+        Bucket=S3_BUCKET, Key=key, UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+    )
+    return object_url(key)
+
+
+def presigned_upload_part_url(key: str, upload_id: str, part_number: int, expires: int = 3600) -> str:
+    """
+    Presigned PUT-ссылка на одну часть multipart-загрузки — клиент отправляет байты
+    прямо в хранилище. ETag части клиент берёт из заголовка ответа
+    (в CORS бакета нужен ExposeHeaders: ETag).
+    """
+    return s3_client.generate_presigned_url(
+        "upload_part",
+        Params={"Bucket": S3_BUCKET, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+        ExpiresIn=expires,
+    )
+
+
+def abort_multipart_upload(key: str, upload_id: str):
+    s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=upload_id)
+
+
+def delete_object(key: str):
+    s3_client.delete_object(Bucket=S3_BUCKET, Key=key)
+
+
+def presigned_url(s3_url: str, expires: int = 3600) -> str:
+    """
+    Presigned GET-ссылка на объект по URL вида, который возвращает upload_fileobj.
+    """
+    key = key_from_url(s3_url)
+    return s3_client.generate_presigned_url(
+        "get_object", Params={"Bucket": S3_BUCKET, "Key": key}, ExpiresIn=expires
+    )
@@ -0,0 +1,149 @@
+# s3/storage.py
+"""
+Асинхронный слой хранилища для веб-API и бота.
+Все вызовы boto3 выполняются в отдельном пуле потоков (размером с пул соединений
+клиента), поэтому не блокируют event loop. Настройки передачи и пула — в s3.s3_client
+(S3_MULTIPART_THRESHOLD, S3_PART_SIZE, S3_MAX_CONCURRENCY, S3_MAX_POOL_CONNECTIONS).
+Для локальной проверки достаточно указать AWS_ENDPOINT_URL на MinIO или moto_server.
+"""
+import asyncio
+import functools
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+from s3 import s3_client as sync
+
+log = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=sync.S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3")
+
+
+async def _run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+object_url = sync.object_url
+key_from_url = sync.key_from_url
+
+
+async def upload_fileobj(fileobj, key: str) -> str:
+    """
+    Загружает файловый объект (managed transfer: multipart и параллельные части).
+    """
+    return await _run(sync.upload_fileobj, fileobj, key)
+
+
+async def upload_file(path: str, key: str) -> str:
+    return await _run(sync.upload_file, path, key)
+
+
+async def download_file(key: str, path: str):
+    await _run(sync.download_file, key, path)
+
+
+async def delete(key: str):
+    await _run(sync.delete_object, key)
+
+
+async def presign_get(key: str, expires: int = 3600) -> str:
+    return await _run(
+        sync.s3_client.generate_presigned_url,
+        "get_object", Params={"Bucket": sync.S3_BUCKET, "Key": key}, ExpiresIn=expires,
+    )
+
+
+async def create_multipart(key: str) -> str:
+    return await _run(sync.create_multipart_upload, key)
+
+
+async def presign_upload_parts(key: str, upload_id: str, count: int, expires: int = 3600) -> list[str]:
+    """
+    Presigned PUT-ссылки на части 1..count multipart-загрузки (для загрузки из браузера).
+    Подпись считается локально, без запросов к хранилищу.
+    """
+    return [sync.presigned_upload_part_url(key, upload_id, n, expires) for n in range(1, count + 1)]
+
+
+async def complete_multipart(key: str, upload_id: str, parts: list[dict]) -> str:
+    return await _run(sync.complete_multipart_upload, key, upload_id, parts)
+
+
+async def abort_multipart(key: str, upload_id: str):
+    await _run(sync.abort_multipart_upload, key, upload_id)
+
+
+async def sha256(key: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """
+    sha256 объекта, прочитанного из хранилища потоком.
+    """
+    hasher = hashlib.sha256()
+    async for chunk in stream(key, chunk_size):
+        await asyncio.to_thread(hasher.update, chunk)
+    return hasher.hexdigest()
+
+
+async def stream(key: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """
+    Читает объект частями, не держа его в памяти целиком.
+    """
+    resp = await _run(sync.s3_client.get_object, Bucket=sync.S3_BUCKET, Key=key)
+    body = resp["Body"]
+    try:
+        while True:
+            chunk = await _run(body.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+async def upload_stream(read: Callable[[int], Awaitable[bytes]], key: str) -> Tuple[str, str, int]:
+    """
+    Потоковая multipart-загрузка из асинхронного источника read(n) (например, UploadFile.read):
+    части по S3_PART_SIZE, sha256 считается по ходу чтения, одновременно
+    отправляется не больше S3_MAX_CONCURRENCY частей.
+    Пиковая память ≈ (S3_MAX_CONCURRENCY + 1) * S3_PART_SIZE независимо от размера файла.
+    Возвращает (s3_url, sha256, размер в байтах).
+    """
+    upload_id = await _run(sync.create_multipart_upload, key)
+    slots = asyncio.Semaphore(sync.S3_MAX_CONCURRENCY)
+    hasher = hashlib.sha256()
+    tasks = []
+    size = 0
+
+    async def send(part_number: int, data: bytes) -> dict:
+        try:
+            return await _run(sync.upload_part, key, upload_id, part_number, data)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            chunk = await read(sync.S3_PART_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            # hashlib отпускает GIL на больших буферах — считаем в потоке
+            await asyncio.to_thread(hasher.update, chunk)
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(len(tasks) + 1, chunk)))
+
+        if not tasks:
+            raise ValueError("Empty upload")
+        parts = await asyncio.gather(*tasks)
+        s3_url = await _run(sync.complete_multipart_upload, key, upload_id, parts)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await _run(sync.abort_multipart_upload, key, upload_id)
+        except Exception:
+            log.exception("Failed to abort multipart upload %s", upload_id)
+        raise
+
+    return s3_url, hasher.hexdigest(), size
@@ -1,16 +1,49 @@
 # src/bot/handlers/search.py
 from aiogram import types
 from aiogram.types import URLInputFile
-import random
-from sqlalchemy import select
-from src.database.session import AsyncSessionLocal
-from src.database.models import VideoObject, Video
 from src.bot.states import SEARCH_STATE
+from src.utils.http_client import get_client
 
 async def start_search(message: types.Message):
     user_id = message.from_user.id
     SEARCH_STATE[user_id] = True  # устанавливаем флаг, что ждем ввода запроса
-    await message.reply("Введите название объекта, который хотите найти (например: person, car, dog).")
+    await message.reply(
+        "Введите название объекта, который хотите найти (например: person, car, dog).\n"
+        "Несколько объектов: «car + person» — видео со всеми, «cat | dog» — с любым из них."
+    )
+
+
+def parse_labels(query_text: str) -> tuple[list[str], str] | None:
+    """
+    «car + person» → (["car", "person"], "all"), «cat | dog» → (["cat", "dog"], "any");
+    один объект → None (обычный поиск по label).
+    """
+    for separator, mode in (("+", "all"), ("|", "any")):
+        if separator in query_text:
+            labels = [l.strip() for l in query_text.split(separator) if l.strip()]
+            return labels, mode
+    return None
+
+
+async def reply_videos_by_labels(message: types.Message, labels: list[str], mode: str):
+    """
+    Поиск обработанных видео по нескольким объектам (/videos/search DB-сервиса).
+    """
+    params = [("label", l) for l in labels] + [
+        ("labels_mode", mode), ("status", "processed"), ("limit", 5),
+    ]
+    response = await get_client().get("/videos/search", params=params)
+    page = response.json() if response.status_code == 200 else {"items": []}
+    if not page["items"]:
+        await message.reply("Ничего не найдено по вашему запросу.")
+        return
+
+    total = page["estimated_total"]
+    text = f"Найдено видео: {'≈' if page['total_is_estimate'] else ''}{total} (показаны последние):\n"
+    for video in page["items"]:
+        found = ", ".join(f"{o['label']} ×{o['total_count']}" for o in video["objects"])
+        text += f"- ID {video['id']}: {found}\n"
+    await message.reply(text)
 
 
 async def handle_search_query(message: types.Message):
@@ -21,54 +54,39 @@ async def handle_search_query(message: types.Message):
         query_text = message.text.strip().lower()
         SEARCH_STATE[user_id] = False  # выходим из режима поиска
 
-        async with AsyncSessionLocal() as session:
-            # 1) Находим все записи в VideoObject, где label удовлетворяет запросу
-            # и извлекаем video_id + best_second
-            stmt = (
-                select(VideoObject.video_id, VideoObject.best_second)
-                .where(VideoObject.label.ilike(f"%{query_text}%"))
-            )
-            result = (await session.execute(stmt)).all()  
-            # result это список кортежей [(video_id, best_second), ...]
-
-            if not result:
-                await message.reply("Ничего не найдено по вашему запросу.")
-                return
-
-            # 2) Случайным образом выбираем 3 записи
-            random.shuffle(result)
-            top_entries = result[:3]
-
-            # Выделяем список video_id, чтобы получить объекты Video
-            top_ids = [row[0] for row in top_entries]
-
-            # 3) Загружаем объекты Video
-            stmt_v = select(Video).where(Video.id.in_(top_ids))
-            videos = (await session.execute(stmt_v)).scalars().all()
+        parsed = parse_labels(query_text)
+        if parsed:
+            await reply_videos_by_labels(message, *parsed)
+            return
 
-        # Создаём словарь video_id -> best_second (чтобы вывести время)
-        vid_to_second = {row[0]: row[1] for row in top_entries}
+        # Поиск в DB-сервисе: 3 лучших совпадения (по уверенности и числу
+        # появлений) вместе со статусом и s3_url видео — один запрос
+        response = await get_client().get("/search", params={"q": query_text, "limit": 3})
+        results = response.json()["items"] if response.status_code == 200 else []
 
-        if not videos:
-            await message.reply("Ничего не найдено (нет объектов Video).")
+        if not results:
+            await message.reply("Ничего не найдено по вашему запросу.")
             return
 
         # Выводим сводку в текстовом сообщении
-        text = "Найдены видео (показаны до 3 случайных):\n"
-        for vid in videos:
-            # Для этого видео находим соответствующее best_second
-            best_sec = vid_to_second.get(vid.id, 0)
-            text += f"- ID {vid.id}, статус={vid.status}, наибольшая уверенность в {best_sec:.1f} c.\n"
+        text = "Найдены видео (показаны до 3 лучших):\n"
+        for row in results:
+            text += (
+                f"- ID {row['video_id']}, статус={row['status']}, "
+                f"наибольшая уверенность в {row['best_second']:.1f} c.\n"
+            )
         await message.reply(text)
 
         # Пример: отправляем само видео (если публичное S3)
-        for vid in videos:
+        for row in results:
             # Проверяем, хранится ли s3_url (или другой способ получить файл)
-            if not getattr(vid, "s3_url", None):
+            if not row.get("s3_url"):
                 continue
 
-            file = URLInputFile(url=vid.s3_url)
-            await message.answer_video(file, caption=f"Видео ID {vid.id}, best_second={vid_to_second[vid.id]:.1f} c.")
+            file = URLInputFile(url=row["s3_url"])
+            await message.answer_video(
+                file, caption=f"Видео ID {row['video_id']}, best_second={row['best_second']:.1f} c."
+            )
 
     else:
         # Пользователь не в режиме поиска
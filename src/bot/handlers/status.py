@@ -1,9 +1,34 @@
 # src/bot/handlers/status.py
-import httpx
 from aiogram import types
-from decouple import config
 
-DB_SERVICE_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
+from src.utils.http_client import get_client
+
+
+def status_text(video_id: int, video_data: dict) -> str:
+    """
+    Статус необработанного видео; во время обработки — с прогрессом
+    (процент, скорость, оставшееся время и предварительно найденные объекты).
+    """
+    text = f"Статус видео {video_id}: {video_data.get('status')}."
+    progress = video_data.get("progress")
+    if video_data.get("status") != "processing" or not progress:
+        return text
+    if progress.get("percent") is not None:
+        text += f"\nОбработано {progress['percent']:.0f}%"
+    else:
+        text += "\nОбработано"
+    if progress.get("segments_total"):
+        # Длинное видео обрабатывается отрезками параллельно
+        text += f" ({progress['segments_done']} из {progress['segments_total']} отрезков)"
+    else:
+        text += f" ({progress['frames_done']} из {progress.get('frames_total') or '?'} кадров, {progress['fps']} кадров/с)"
+    if progress.get("eta_seconds") is not None:
+        minutes, seconds = divmod(progress["eta_seconds"], 60)
+        text += f", осталось ≈ {minutes} мин {seconds} с"
+    if progress.get("labels"):
+        text += "\nПока найдено: " + ", ".join(f"{l['label']} ×{l['total_count']}" for l in progress["labels"])
+    return text
+
 
 async def status_cmd(message: types.Message):
     # Предположим, пользователь вводит "/status 10"
@@ -18,25 +43,19 @@ async def status_cmd(message: types.Message):
         await message.reply("Неверный формат ID.")
         return
 
-    async with httpx.AsyncClient() as client:
-        # Получаем информацию о видео
-        response = await client.get(f"{DB_SERVICE_URL}/videos/{video_id}")
-        if response.status_code == 404:
-            await message.reply(f"Видео с ID {video_id} не найдено.")
-            return
-        video_data = response.json()
-
-        # Если статус не processed, сообщаем статус и выходим
-        if video_data.get("status") != "processed":
-            await message.reply(f"Статус видео {video_id}: {video_data.get('status')}.")
-            return
-
-        # Получаем агрегированные объекты видео
-        response = await client.get(f"{DB_SERVICE_URL}/videos/{video_id}/objects")
-        if response.status_code == 404:
-            await message.reply("Для этого видео нет данных по распознанным объектам.")
-            return
-        objects = response.json()
+    # Получаем видео вместе с агрегированными объектами одним запросом
+    response = await get_client().get(f"/videos/{video_id}/full")
+    if response.status_code == 404:
+        await message.reply(f"Видео с ID {video_id} не найдено.")
+        return
+    video_data = response.json()
+
+    # Если статус не processed, сообщаем статус (и ход обработки) и выходим
+    if video_data.get("status") != "processed":
+        await message.reply(status_text(video_id, video_data))
+        return
+
+    objects = video_data.get("objects", [])
 
     if not objects:
         await message.reply("В этом видео не обнаружено объектов.")
@@ -1,9 +1,8 @@
 # src/bot/handlers/status_callback.py
-import httpx
 from aiogram import types
-from decouple import config
 
-DB_SERVICE_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
+from src.bot.handlers.status import status_text
+from src.utils.http_client import get_client
 
 async def status_callback_handler(callback: types.CallbackQuery):
     """
@@ -16,25 +15,19 @@ async def status_callback_handler(callback: types.CallbackQuery):
         await callback.answer("Некорректные данные!", show_alert=True)
         return
 
-    async with httpx.AsyncClient() as client:
-        # Получаем данные видео
-        video_response = await client.get(f"{DB_SERVICE_URL}/videos/{video_id}")
-        if video_response.status_code == 404:
-            await callback.message.reply(f"Видео с id={video_id} не найдено.")
-            return
-        video_data = video_response.json()
-
-        # Если статус видео не "processed", сообщаем об этом
-        if video_data.get("status") != "processed":
-            await callback.message.reply(f"Статус видео {video_id}: {video_data.get('status')}.")
-            return
-
-        # Получаем агрегированные данные по объектам
-        objects_response = await client.get(f"{DB_SERVICE_URL}/videos/{video_id}/objects")
-        if objects_response.status_code != 200:
-            await callback.message.reply("Не удалось получить данные по объектам.")
-            return
-        objects = objects_response.json()
+    # Получаем данные видео вместе с агрегатами по объектам
+    video_response = await get_client().get(f"/videos/{video_id}/full")
+    if video_response.status_code == 404:
+        await callback.message.reply(f"Видео с id={video_id} не найдено.")
+        return
+    video_data = video_response.json()
+
+    # Если статус видео не "processed", сообщаем об этом (с ходом обработки)
+    if video_data.get("status") != "processed":
+        await callback.message.reply(status_text(video_id, video_data))
+        return
+
+    objects = video_data.get("objects", [])
 
     if not objects:
         await callback.message.reply("В этом видео не обнаружено объектов.")
@@ -0,0 +1,71 @@
+# src/bot/notifications.py
+"""
+Уведомление пользователя о завершении обработки его видео.
+Вместо опроса по кнопке бот держит long-poll запрос к DB-сервису
+(/videos/{id}/wait) и пишет в чат, когда статус станет processed или error.
+Ожидания живут в памяти бота и не переживают его перезапуск.
+"""
+import asyncio
+import logging
+import time
+
+import httpx
+from aiogram import Bot
+from decouple import config
+
+from src.bot.keyboards.status import get_status_keyboard
+from src.utils.http_client import get_wait_client
+
+log = logging.getLogger(__name__)
+
+# Сколько ждать завершения обработки, прежде чем перестать следить за видео
+NOTIFY_MAX_SECONDS = config("BOT_NOTIFY_MAX_SECONDS", default=6 * 3600, cast=int)
+# Длительность одного long-poll запроса (не больше LONG_POLL_MAX_SECONDS DB-сервиса)
+WAIT_SECONDS = 25.0
+FINAL_STATUSES = ("processed", "error")
+
+_tasks: set[asyncio.Task] = set()
+
+
+async def wait_for_final_status(video_id: int, status: str = "pending") -> str | None:
+    deadline = time.monotonic() + NOTIFY_MAX_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            response = await get_wait_client().get(
+                f"/videos/{video_id}/wait",
+                params={"since": status, "timeout": WAIT_SECONDS},
+                timeout=WAIT_SECONDS + 10,
+            )
+        except httpx.HTTPError as exc:
+            log.warning("Waiting for video %s failed: %s", video_id, exc)
+            await asyncio.sleep(5)
+            continue
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            await asyncio.sleep(5)
+            continue
+        status = response.json()["status"]
+        if status in FINAL_STATUSES:
+            return status
+    return None
+
+
+async def notify_when_done(bot: Bot, chat_id: int, video_id: int):
+    status = await wait_for_final_status(video_id)
+    if status == "processed":
+        text = f"Видео {video_id} обработано. Нажмите кнопку, чтобы посмотреть найденные объекты."
+    elif status == "error":
+        text = f"Не удалось обработать видео {video_id}."
+    else:
+        return
+    await bot.send_message(chat_id, text, reply_markup=get_status_keyboard(video_id))
+
+
+def watch_video(bot: Bot, chat_id: int, video_id: int):
+    """
+    Запускает фоновое ожидание результата для видео пользователя.
+    """
+    task = asyncio.create_task(notify_when_done(bot, chat_id, video_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
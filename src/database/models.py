@@ -15,6 +15,9 @@ class Video(Base):
     user_id = Column(Integer)
     upload_time = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="pending")  # "pending", "processing", "processed"
+    # Режим выборки кадров, с которым получена статистика ("all", "stride", "fps")
+    sampling_mode = Column(String, nullable=True)
+    frame_stride = Column(Integer, nullable=True)  # обрабатывался каждый k-й кадр
 
     # Новая связь к сводной таблице
     objects_summary = relationship("VideoObject", back_populates="video")
@@ -14,6 +14,7 @@ from src.bot.handlers.start import start_cmd
 from src.bot.handlers.video import handle_video
 from src.bot.handlers.text import handle_text
 from src.bot.handlers.status import status_cmd
+from src.utils import http_client
 
 async def main():
     logging.basicConfig(level=logging.INFO)
@@ -33,8 +34,13 @@ async def main():
     # Инициализируем БД (создаём таблицы, если их нет)
     # await init_db(Base)
 
-    # Запускаем поллинг
-    await dp.start_polling(bot)
+    # Общий HTTP-клиент к DB-сервису на всё время работы бота
+    await http_client.start()
+    try:
+        # Запускаем поллинг
+        await dp.start_polling(bot)
+    finally:
+        await http_client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,74 +1,57 @@
 # src/recognition.py
+import asyncio
 import cv2
-from ultralytics import YOLO
 from math import floor
 
-from src.database.models import VideoObject
+from recognition_service.aggregation import LabelAggregator
+from recognition_service.sampling import resolve_stride, SceneChangeSelector
+from recognition_service.pipeline import FramePipeline
+from recognition_service.engine import create_engine
+from src.database.models import Video, VideoObject
 
-# Загружаем модель (YOLOv8n как пример)
-model = YOLO("yolov8n.pt")
+# Загружаем модель (YOLOv8n как пример); бэкенд выбирается RECOGNITION_BACKEND
+engine = create_engine("yolov8n.pt")
 
-async def detect_objects_in_video(session, video_id: int, video_path: str):
+async def detect_objects_in_video(session, video_id: int, video_path: str,
+                                  sampling_mode: str = "all", frame_stride: int = 1,
+                                  sample_fps: float = 1.0):
     """
     Агрегированная статистика по классам:
       - total_count: сколько раз встретился класс
       - avg_confidence: средняя уверенность 
       - best_confidence: максимальная уверенность
       - best_second: время (в секундах), когда была максимальная уверенность
+    sampling_mode: "all" | "stride" (каждый frame_stride-й кадр) | "fps" (sample_fps кадров/с)
+    | "scene" (модель запускается только при смене сцены).
+    При выборке счётчики умножаются на шаг, режим сохраняется в Video.
     """
-    counts = {}
-    sum_conf = {}
-    best_conf = {}
-    best_second = {}
+    aggregator = LabelAggregator(engine.names)
 
     cap = cv2.VideoCapture(video_path)
     fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
-    frame_index = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_index += 1
+    stride = resolve_stride(sampling_mode, fps, frame_stride, sample_fps)
+    selector = SceneChangeSelector() if sampling_mode == "scene" else None
 
-        # Запускаем детектор
-        results = model(frame)
-        r = results[0]
-        boxes = r.boxes  # Detected boxes
-
-        # Обходим каждую найденную детекцию
-        for i in range(len(boxes)):
-            conf = float(boxes.conf[i])
-            cls_id = int(boxes.cls[i])
-            label = r.names[cls_id]
-
-            # Увеличиваем счётчик для класса
-            counts[label] = counts.get(label, 0) + 1
-            # Накопление суммы для среднего
-            sum_conf[label] = sum_conf.get(label, 0.0) + conf
-
-            # Максимальная уверенность
-            if label not in best_conf or conf > best_conf[label]:
-                best_conf[label] = conf
-                best_second[label] = frame_index / fps
-
-    cap.release()
+    # Декодирование, инференция и агрегация идут конвейером в отдельных потоках,
+    # чтобы не блокировать event loop
+    pipeline = FramePipeline(
+        cap, engine, aggregator.add_detections,
+        fps=fps, stride=stride, selector=selector,
+    )
+    try:
+        await asyncio.to_thread(pipeline.run)
+    finally:
+        cap.release()
 
     # Сохраняем результаты в БД
-    for label, total_count in counts.items():
-        avg_conf = sum_conf[label] / total_count
-        bc = best_conf[label]
-        bs = best_second[label]
+    for payload in aggregator.to_payloads(video_id):
+        session.add(VideoObject(**payload))
 
-        vo = VideoObject(
-            video_id=video_id,
-            label=label,
-            total_count=total_count,
-            avg_confidence=avg_conf,
-            best_confidence=bc,
-            best_second=bs
-        )
-        session.add(vo)
+    video = await session.get(Video, video_id)
+    if video is not None:
+        video.sampling_mode = sampling_mode
+        video.frame_stride = stride
 
     await session.commit()
-    print(f"Video {video_id} завершено (агрегированная статистика).")
+    print(f"Video {video_id} завершено (агрегированная статистика, пропущено инференций: {pipeline.skipped}).")
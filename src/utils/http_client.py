@@ -0,0 +1,67 @@
+# src/utils/http_client.py
+"""
+Общий HTTP-клиент бота для обращений к DB-сервису: создаётся при запуске
+бота (src/main.py) и закрывается при остановке; хэндлеры переиспользуют
+его соединения (keep-alive) вместо нового клиента на каждый запрос.
+Long-poll ожидания результата (src/bot/notifications.py) идут через
+отдельный клиент со своим пулом, чтобы не занимать соединения хэндлеров.
+"""
+import httpx
+from decouple import config
+
+DB_SERVICE_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
+DB_HTTP_TIMEOUT = config("DB_HTTP_TIMEOUT", default=20.0, cast=float)
+DB_HTTP_MAX_CONNECTIONS = config("DB_HTTP_MAX_CONNECTIONS", default=100, cast=int)
+DB_HTTP_MAX_KEEPALIVE = config("DB_HTTP_MAX_KEEPALIVE", default=20, cast=int)
+# HTTP/2 требует пакет h2 (pip install "httpx[http2]")
+DB_HTTP2 = config("DB_HTTP2", default=False, cast=bool)
+# Сколько видео бот может ждать одновременно (одно соединение на long-poll)
+DB_HTTP_WAIT_CONNECTIONS = config("DB_HTTP_WAIT_CONNECTIONS", default=1000, cast=int)
+
+_client: httpx.AsyncClient | None = None
+_wait_client: httpx.AsyncClient | None = None
+
+
+async def start():
+    global _client, _wait_client
+    if _wait_client is None:
+        _wait_client = httpx.AsyncClient(
+            base_url=DB_SERVICE_URL,
+            timeout=httpx.Timeout(DB_HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=DB_HTTP_WAIT_CONNECTIONS, max_keepalive_connections=0),
+        )
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=DB_SERVICE_URL,
+            timeout=httpx.Timeout(DB_HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=DB_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_HTTP_MAX_KEEPALIVE,
+            ),
+            http2=DB_HTTP2,
+        )
+
+
+async def close():
+    global _client, _wait_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _wait_client is not None:
+        await _wait_client.aclose()
+        _wait_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client is not started")
+    return _client
+
+
+def get_wait_client() -> httpx.AsyncClient:
+    """
+    Клиент для long-poll запросов с отдельным пулом соединений.
+    """
+    if _wait_client is None:
+        raise RuntimeError("HTTP client is not started")
+    return _wait_client
@@ -0,0 +1,28 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# Пакеты сервисов импортируются от корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# celery_app читает BROKER_URL при импорте; сам брокер в тестах не нужен
+os.environ.setdefault("BROKER_URL", "memory://")
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """
+    FakeEngine вместо модели и мелкие интервалы прогресса / checkpoint,
+    выборка каждого STRIDE-го кадра.
+    """
+    from recognition_service import detect
+    from fakes import STRIDE, FakeEngine
+
+    engine = FakeEngine()
+    monkeypatch.setattr(detect, "get_engine", lambda: engine)
+    monkeypatch.setattr(detect, "FRAME_STRIDE", STRIDE)
+    monkeypatch.setattr(detect, "BATCH_SIZE", 4)
+    monkeypatch.setattr(detect, "PROGRESS_SECONDS", 0.0)
+    monkeypatch.setattr(detect, "CHECKPOINT_SECONDS", 1e-9)
+    return engine
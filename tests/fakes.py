@@ -0,0 +1,70 @@
+# tests/fakes.py
+"""
+Поддельные видео и детектор для тестов конвейера распознавания.
+"""
+import cv2
+import numpy as np
+
+from recognition_service.engine import Detections
+
+TOTAL_FRAMES = 300
+STRIDE = 3
+
+
+class FakeCapture:
+    """
+    cv2.VideoCapture с кадрами 4x4, в пикселе (0, 0) которых записан номер кадра.
+    available < total имитирует оборванный поток: кадры после available
+    не читаются, хотя CAP_PROP_FRAME_COUNT сообщает total.
+    """
+
+    def __init__(self, total: int = TOTAL_FRAMES, available: int | None = None):
+        self.total = total
+        self.available = total if available is None else available
+        self.pos = 0
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FPS: 25.0,
+            cv2.CAP_PROP_FRAME_COUNT: self.total,
+            cv2.CAP_PROP_FRAME_WIDTH: 4,
+            cv2.CAP_PROP_FRAME_HEIGHT: 4,
+        }.get(prop, 0)
+
+    def set(self, prop, value):
+        assert prop == cv2.CAP_PROP_POS_FRAMES
+        self.pos = int(value)
+        return True
+
+    def grab(self):
+        if self.pos >= self.available:
+            return False
+        self.pos += 1
+        return True
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        frame = np.zeros((4, 4, 3), np.uint8) if image is None else image
+        frame[0, 0, :2] = divmod(self.pos - 1, 256)
+        return True, frame
+
+
+class FakeEngine:
+    """
+    Детектор, результат которого зависит только от номера кадра;
+    запоминает номера кадров, прошедших через инференцию.
+    """
+    names = {0: "person", 1: "car", 2: "dog"}
+
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, frames):
+        detections = []
+        for frame in frames:
+            index = int(frame[0, 0, 0]) * 256 + int(frame[0, 0, 1])
+            self.seen.append(index)
+            # Уверенности кратны 1/8 — суммы точны при любом порядке сложения
+            detections.append(Detections(np.array([index % 3]), np.array([0.25 + (index % 4) / 8])))
+        return detections
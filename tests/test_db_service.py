@@ -0,0 +1,82 @@
+# tests/test_db_service.py
+"""
+DB-сервис на SQLite: регистрация дубликата по хэшу и аренда видео задачей
+(второй владелец получает отказ, владелец продлевает, истёкшую аренду
+перехватывает другая задача).
+"""
+import importlib
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+DB_SERVICE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db_service")
+
+VIDEO = {"user_id": 1, "video_hash": "abc", "upload_time": "2024-01-01T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # Модули DB-сервиса импортируются плоско (import models, schemas),
+    # а движок создаётся при импорте по DATABASE_URL
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('db') / 'test.sqlite'}"
+    sys.path.insert(0, DB_SERVICE_DIR)
+    try:
+        app = importlib.import_module("app")
+        app.engine.echo = False
+        with TestClient(app.app) as client:
+            yield client
+    finally:
+        sys.path.remove(DB_SERVICE_DIR)
+
+
+@pytest.fixture
+def video_id(client):
+    resp = client.post("/videos/", json={**VIDEO, "video_hash": os.urandom(8).hex()})
+    assert resp.status_code == 201
+    return resp.json()["id"]
+
+
+def lease(client, video_id: int, owner: str, seconds: float = 600):
+    resp = client.post(f"/videos/{video_id}/lease", json={"owner": owner, "seconds": seconds})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_duplicate_insert_returns_existing_video(client):
+    first = client.post("/videos/", json=VIDEO)
+    assert first.status_code == 201
+    assert first.json()["duplicate"] is False
+
+    second = client.post("/videos/", json=VIDEO)
+    assert second.status_code == 200
+    assert second.json()["duplicate"] is True
+    assert second.json()["id"] == first.json()["id"]
+
+
+def test_second_owner_is_refused(client, video_id):
+    assert lease(client, video_id, "task-a")["acquired"] is True
+    refused = lease(client, video_id, "task-b")
+    assert refused["acquired"] is False
+    assert refused["owner"] == "task-a"
+
+
+def test_owner_renews_lease(client, video_id):
+    first = lease(client, video_id, "task-a", 60)
+    renewed = lease(client, video_id, "task-a", 3600)
+    assert renewed["acquired"] is True
+    assert renewed["expires"] > first["expires"]
+    # Продление на меньший срок не сокращает уже выданную аренду
+    assert lease(client, video_id, "task-a", 60)["expires"] == renewed["expires"]
+
+
+def test_expired_lease_is_taken_over(client, video_id):
+    assert lease(client, video_id, "task-a", 0.05)["acquired"] is True
+    time.sleep(0.1)
+    taken = lease(client, video_id, "task-b")
+    assert taken["acquired"] is True
+    assert taken["owner"] == "task-b"
+    # Прежний владелец больше не может продлить аренду
+    assert lease(client, video_id, "task-a")["acquired"] is False
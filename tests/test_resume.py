@@ -0,0 +1,60 @@
+# tests/test_resume.py
+"""
+Продолжение обработки с checkpoint: воркер «убит» после сохранения
+checkpoint, повторная задача досчитывает только оставшиеся кадры,
+а итоговые агрегаты совпадают с обработкой без перерыва.
+"""
+import pytest
+
+from recognition_service import detect
+
+from fakes import TOTAL_FRAMES, FakeCapture
+
+
+class Killed(Exception):
+    pass
+
+
+def test_resume_processes_only_remaining_frames(engine, monkeypatch):
+    full, _, _ = detect.run_recognition(FakeCapture(), "stride")
+    full_seen = sorted(engine.seen)
+
+    # Первая попытка: воркер погибает после checkpoint во второй половине видео
+    checkpoints = []
+
+    def send(self, update):
+        if "checkpoint" in update:
+            checkpoints.append(update["checkpoint"])
+            if update["checkpoint"]["frame"] >= TOTAL_FRAMES // 2:
+                raise Killed()
+
+    monkeypatch.setattr(detect.ProgressReporter, "send", send)
+    progress = detect.ProgressReporter(1, TOTAL_FRAMES, "key")
+    with pytest.raises(Killed):
+        detect.run_recognition(FakeCapture(), "stride", progress=progress)
+    checkpoint = checkpoints[-1]
+    assert TOTAL_FRAMES // 2 <= checkpoint["frame"] < TOTAL_FRAMES
+
+    # Повторная задача продолжает с checkpoint
+    start_frame, partial = detect.resume_point({"checkpoint": checkpoint}, {"analysis_key": "key"}, False)
+    assert start_frame == checkpoint["frame"]
+    engine.seen = []
+    resumed, pipeline, _ = detect.run_recognition(FakeCapture(), "stride", start_frame, partial=partial)
+
+    assert sorted(engine.seen) == [i for i in full_seen if i >= start_frame]
+    assert pipeline.processed == len(engine.seen)
+    assert resumed.to_partial() == full.to_partial()
+
+
+def test_checkpoint_ignored_for_other_analysis_or_force():
+    video = {"checkpoint": {"analysis_key": "old", "frame": 120, "partial": {}}}
+    assert detect.resume_point(video, {"analysis_key": "new"}, False) == (0, None)
+    assert detect.resume_point(video, {"analysis_key": "old"}, True) == (0, None)
+    assert detect.resume_point({}, {"analysis_key": "old"}, False) == (0, None)
+
+
+def test_first_report_after_resume_has_no_rate_spike():
+    progress = detect.ProgressReporter(1, TOTAL_FRAMES, "key", start_frame=200)
+    snapshot = progress.snapshot(200)
+    assert snapshot["fps"] == 0
+    assert "eta_seconds" not in snapshot
@@ -0,0 +1,54 @@
+# tests/test_stream_fallback.py
+"""
+Оборванный HTTP-поток читается cv2 как конец видео: recognize_source
+должна заметить недочитанные кадры и досчитать их по скачанному файлу.
+"""
+from types import SimpleNamespace
+
+from recognition_service import detect
+
+from fakes import TOTAL_FRAMES, FakeCapture
+
+
+class FakeFileSource:
+    """
+    VideoSource(stream=False): полное видео из «скачанного файла».
+    """
+    opened = 0
+
+    def __init__(self, url, stream=True):
+        assert stream is False
+        self.url = url
+        self.mode = "file"
+        self.cap = FakeCapture()
+
+    def __enter__(self):
+        FakeFileSource.opened += 1
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_broken_stream_continues_from_file(engine, monkeypatch):
+    full, _, _ = detect.run_recognition(FakeCapture(), "stride")
+    full_seen = sorted(engine.seen)
+    engine.seen = []
+
+    monkeypatch.setattr(detect, "VideoSource", FakeFileSource)
+    FakeFileSource.opened = 0
+    stream = SimpleNamespace(url="http://s3/video.mp4", mode="stream",
+                             cap=FakeCapture(available=TOTAL_FRAMES // 2))
+    aggregator, _, _ = detect.recognize_source(stream, "stride")
+
+    assert FakeFileSource.opened == 1
+    assert sorted(engine.seen) == full_seen  # ни один кадр не пропущен и не посчитан дважды
+    assert aggregator.to_partial() == full.to_partial()
+
+
+def test_complete_stream_is_not_downloaded(engine, monkeypatch):
+    monkeypatch.setattr(detect, "VideoSource", FakeFileSource)
+    FakeFileSource.opened = 0
+    stream = SimpleNamespace(url="http://s3/video.mp4", mode="stream", cap=FakeCapture())
+    detect.recognize_source(stream, "stride")
+    assert FakeFileSource.opened == 0
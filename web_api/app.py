@@ -1,41 +1,64 @@
-import asyncio
+import asyncio, logging, math
 from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import httpx, io, hashlib, os
+import httpx, io, hashlib, os, uuid
 from decouple import config
 from datetime import datetime
-from recognition_service.celery_app import celery_app
-from s3.s3_client import upload_fileobj
+from urllib.parse import urlencode
+from recognition_service.client import enqueue_process_video
+from s3 import storage
 import yt_dlp
 import re, json
-from web_api.utils.downloader import fetch_video_bytes
+from web_api.utils import ingest, http_client
+from web_api.utils.downloader import normalize_url
 
 
-DB_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
 API_PORT = int(config("WEB_API_PORT", default=8080))
+# Время жизни presigned-ссылок на части прямой загрузки из браузера
+DIRECT_UPLOAD_EXPIRES = config("DIRECT_UPLOAD_EXPIRES", default=3600, cast=int)
+# Лимит S3 на число частей одной multipart-загрузки
+MAX_UPLOAD_PARTS = 10000
+
+log = logging.getLogger(__name__)
 
 app = FastAPI(title="Vid‑Obj Hub — Web UI")
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")), name="static")
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
 
 # ---------- helpers ---------------------------------------------------------
+@app.on_event("startup")
+async def startup():
+    await http_client.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await http_client.close()
+
 async def db_post(path: str, json: dict):
-    async with httpx.AsyncClient(timeout=20) as c:
-        return await c.post(f"{DB_URL}{path}", json=json)
+    return await http_client.get_client().post(path, json=json)
 
 async def db_put(path: str, json: dict):
-    async with httpx.AsyncClient(timeout=20) as c:
-        return await c.put(f"{DB_URL}{path}", json=json)
+    return await http_client.get_client().put(path, json=json)
 
 async def db_get(path: str, params=None):
-    async with httpx.AsyncClient(timeout=20) as c:
-        return await c.get(f"{DB_URL}{path}", params=params)
+    return await http_client.get_client().get(path, params=params)
 
 def sha256_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
+def _register_payload(sha: str, s3_url: str) -> dict:
+    return {
+        "telegram_file_id": None,
+        "user_id": 0,
+        "video_hash": sha,
+        "status": "pending",
+        "upload_time": datetime.utcnow().isoformat(),
+        "s3_url": s3_url,
+    }
+
 
 VK_TOKEN = config("access_user_token", default="")
 
@@ -114,100 +137,307 @@ async def index(request: Request):
 
 @app.post("/upload/file")
 async def upload_file(request: Request, file: UploadFile = File(...)):
-    data = await file.read()
-    sha = sha256_bytes(data)
-
-    payload_init = {
-        "telegram_file_id": None,          # вместо None
-        "user_id": 0,
-        "video_hash": sha,
-        "status": "pending",
-        "upload_time": datetime.utcnow().isoformat(),
-        "s3_url": ""                     # тоже пустая строка
-    }
+    """
+    Потоково заливает файл в S3 (multipart, sha256 по ходу чтения),
+    затем регистрирует видео в БД‑сервисе и ставит задачу Celery.
+    Хэш известен только после загрузки, поэтому ключ объекта случайный,
+    а загруженный дубликат удаляется из S3.
+    """
+    key = f"videos/upload-{uuid.uuid4().hex}.mp4"
+    try:
+        s3_url, sha, size = await storage.upload_stream(file.read, key)
+    except ValueError:
+        raise HTTPException(400, "Пустой файл")
 
-    res = await db_post("/videos/", payload_init)
+    res = await db_post("/videos/", _register_payload(sha, s3_url))
     if res.status_code not in (200, 201):
+        await storage.delete(key)
         raise HTTPException(res.status_code, res.text)
     j = res.json()
     vid = j["id"]
     if j.get("duplicate"):
+        await storage.delete(key)
         return RedirectResponse(url=f"/status/{vid}", status_code=303)
 
-    # загрузка в S3
-    s3_url = upload_fileobj(io.BytesIO(data), key=f"videos/{sha}.mp4")
-    await db_put(f"/videos/{vid}", {"s3_url": s3_url})
-
-    celery_app.send_task("process_video_task", args=[vid])
+    enqueue_process_video(vid)
     return RedirectResponse(url=f"/status/{vid}", status_code=303)
 
-@app.post("/upload/url")
-async def upload_url(request: Request, url: str = Form(...)):
+# ---------- direct-to-S3 upload -------------------------------------------
+# Браузер получает presigned-ссылки на части multipart-загрузки и отправляет байты
+# прямо в хранилище; web_api участвует только в начале и в завершении.
+
+class DirectUploadStart(BaseModel):
+    filename: str
+    size: int
+
+
+class DirectUploadPart(BaseModel):
+    PartNumber: int
+    ETag: str
+
+
+class DirectUploadComplete(BaseModel):
+    key: str
+    upload_id: str
+    parts: list[DirectUploadPart]
+
+
+class DirectUploadAbort(BaseModel):
+    key: str
+    upload_id: str
+
+
+def _check_direct_key(key: str):
+    # Завершать и отменять можно только загрузки, начатые через /upload/direct/start
+    if not key.startswith("videos/upload-"):
+        raise HTTPException(400, "Unknown upload key")
+
+
+@app.post("/upload/direct/start")
+async def direct_upload_start(body: DirectUploadStart):
     """
-    Получает ссылку (VK / Rutube / YouTube etc.), скачивает видео через yt‑dlp,
-    заносит запись в БД‑сервис, заливает в S3 и ставит задачу Celery.
+    Начинает прямую загрузку: возвращает ключ, UploadId, размер части
+    и presigned PUT-ссылки на все части.
     """
-    # 1) качаем
-    data = await fetch_video_bytes(url)
-    sha = sha256_bytes(data)
-
-    # 2) черновик записи (без s3_url)
-    payload = {
-        "telegram_file_id": None,
-        "user_id": 0,
-        "video_hash": sha,
-        "status": "pending",
-        "upload_time": datetime.utcnow().isoformat(),
-        "s3_url": "",
+    if body.size <= 0:
+        raise HTTPException(400, "Пустой файл")
+
+    part_size = max(storage.sync.S3_PART_SIZE, math.ceil(body.size / MAX_UPLOAD_PARTS))
+    count = math.ceil(body.size / part_size)
+    key = f"videos/upload-{uuid.uuid4().hex}.mp4"
+    upload_id = await storage.create_multipart(key)
+    urls = await storage.presign_upload_parts(key, upload_id, count, DIRECT_UPLOAD_EXPIRES)
+    return {
+        "key": key,
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "parts": [{"part_number": n, "url": url} for n, url in enumerate(urls, 1)],
     }
-    resp = await db_post("/videos/", payload)
-    if resp.status_code not in (200, 201):
-        raise HTTPException(resp.status_code, resp.text)
 
-    video = resp.json()
-    vid   = video["id"]
 
-    # 3) если дубликат — редирект на статус
-    if video.get("duplicate"):
-        return RedirectResponse(f"/status/{vid}", status_code=303)
+async def register_direct_upload(key: str, s3_url: str, sha: str) -> tuple[int, bool]:
+    """
+    Регистрирует загруженный объект в БД‑сервисе и ставит задачу Celery;
+    дубликат удаляется из хранилища. Возвращает (video_id, duplicate).
+    """
+    res = await db_post("/videos/", _register_payload(sha, s3_url))
+    if res.status_code not in (200, 201):
+        await storage.delete(key)
+        raise HTTPException(res.status_code, res.text)
+    j = res.json()
+    if j.get("duplicate"):
+        await storage.delete(key)
+    else:
+        enqueue_process_video(j["id"])
+    return j["id"], j.get("duplicate", False)
+
+
+async def hash_direct_upload(job: ingest.IngestJob, key: str):
+    """
+    Фоновое задание: хэш объекта считается из хранилища уже после ответа
+    на /upload/direct/complete. Дубликаты ищутся только по этому хэшу —
+    дайджесту клиента не доверяем.
+    """
+    job.status = "hashing"
+    sha = await storage.sha256(key)
+    job.video_id, _ = await register_direct_upload(key, job.url, sha)
+
+
+@app.post("/upload/direct/complete")
+async def direct_upload_complete(body: DirectUploadComplete):
+    """
+    Завершает прямую загрузку. Хэш (нужный для поиска дубликатов) считается
+    фоновым заданием, которое затем регистрирует видео и ставит задачу Celery;
+    клиент получает страницу задания /jobs/{id} — объект не прокачивается
+    через web_api внутри запроса.
+    """
+    _check_direct_key(body.key)
+    try:
+        s3_url = await storage.complete_multipart(
+            body.key, body.upload_id, [p.model_dump() for p in body.parts]
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Cannot complete upload: {exc}")
+
+    # Хэш-задания не ограничены очередью ссылок: объект уже загружен,
+    # и отказывать клиенту или считать хэш внутри запроса нельзя
+    job = ingest.submit(s3_url, lambda job: hash_direct_upload(job, body.key), limited=False)
+    return {"duplicate": False, "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+
+@app.post("/upload/direct/abort")
+async def direct_upload_abort(body: DirectUploadAbort):
+    _check_direct_key(body.key)
+    await storage.abort_multipart(body.key, body.upload_id)
+    return {"aborted": True}
+
+
+async def ingest_url(job: ingest.IngestJob):
+    """
+    Проверяет кэш источников по id ролика у экстрактора,
+    скачивает видео по ссылке на диск, регистрирует его в БД‑сервисе,
+    заливает в S3 прямо из файла и ставит задачу Celery.
+    """
+    job.status = "probing"
+    info = await ingest.probe(job.url)
+    job.title = info.get("title")
+    source = {
+        "url": normalize_url(job.url),
+        "extractor": info.get("extractor_key"),
+        "extractor_id": str(info["id"]) if info.get("id") is not None else None,
+    }
+    # Та же запись под другой ссылкой (youtu.be / youtube.com, vk.com / vkvideo.ru ...)
+    known = await db_get("/sources/lookup", params={k: v for k, v in source.items() if v})
+    if known.status_code == 200:
+        job.video_id = known.json()["id"]
+        await db_post("/sources/", {**source, "video_id": job.video_id})
+        return
+
+    job.status = "downloading"
+    path, tmp_dir, job.title = await ingest.download(job.url, info)
+    try:
+        job.status = "hashing"
+        sha = await ingest.sha256(path)
+
+        # черновик записи (без s3_url); дубликат не загружаем повторно
+        res = await db_post("/videos/", _register_payload(sha, ""))
+        if res.status_code not in (200, 201):
+            raise RuntimeError(f"DB service: {res.status_code} {res.text}")
+        video = res.json()
+        job.video_id = video["id"]
+        if video.get("duplicate"):
+            await db_post("/sources/", {**source, "video_id": job.video_id})
+            return
+
+        job.status = "uploading"
+        s3_url = await storage.upload_file(path, f"videos/{sha}.mp4")
+        res = await db_put(f"/videos/{job.video_id}", {"s3_url": s3_url})
+        if res.status_code != 200:
+            raise RuntimeError(f"DB service: {res.status_code} {res.text}")
+        enqueue_process_video(job.video_id)
+        # Ссылка запоминается только для загруженного и поставленного в очередь видео,
+        # иначе /upload/url вёл бы на черновик, который никогда не обработается
+        await db_post("/sources/", {**source, "video_id": job.video_id})
+    finally:
+        await ingest.cleanup(tmp_dir)
 
-    # 4) загружаем в S3
-    s3_url = upload_fileobj(io.BytesIO(data), key=f"videos/{sha}.mp4")
-    await db_put(f"/videos/{vid}", {"s3_url": s3_url})
 
-    # 5) Celery
-    celery_app.send_task("process_video_task", args=[vid])
+@app.post("/upload/url")
+async def upload_url(request: Request, url: str = Form(...)):
+    """
+    Ставит ссылку (VK / Rutube / YouTube etc.) в фоновую очередь загрузки
+    и сразу перенаправляет на страницу задания. Уже известные ссылки
+    (по нормализованному URL) сразу ведут на статус видео.
+    """
+    # Ссылка уже загружалась — сразу на страницу статуса, без скачивания
+    known = await db_get("/sources/lookup", params={"url": normalize_url(url)})
+    if known.status_code == 200:
+        return RedirectResponse(f"/status/{known.json()['id']}", status_code=303)
+
+    job = ingest.submit(url, ingest_url)
+    return RedirectResponse(f"/jobs/{job.id}", status_code=303)
 
-    return RedirectResponse(f"/status/{vid}", status_code=303)
 
+@app.get("/jobs/{job_id}", response_class=HTMLResponse)
+async def job_page(request: Request, job_id: str):
+    job = ingest.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "job not found")
+    if job.status == "done" and job.video_id is not None:
+        return RedirectResponse(f"/status/{job.video_id}", status_code=303)
+    return templates.TemplateResponse("job.html", {"request": request, "job": job})
 
 
 @app.get("/status/{video_id}", response_class=HTMLResponse)
 async def status_page(request: Request, video_id: int):
-    v = await db_get(f"/videos/{video_id}")
+    v = await db_get(f"/videos/{video_id}/full")
     if v.status_code != 200:
         raise HTTPException(404, "video not found")
     video = v.json()
-
-    objects = []
-    if video["status"] == "processed":
-        o = await db_get(f"/videos/{video_id}/objects")
-        objects = o.json() if o.status_code == 200 else []
+    objects = video.pop("objects", []) if video["status"] == "processed" else []
 
     return templates.TemplateResponse(
         "status.html",
         {"request": request, "video": video, "objects": objects}
     )
 
+async def search_videos_by_criteria(criteria: dict, cursor: str | None) -> dict:
+    """
+    Расширенный поиск видео через /videos/search DB-сервиса.
+    labels — через запятую; after / before — даты (YYYY-MM-DD).
+    """
+    params = [("label", l.strip()) for l in criteria["labels"].split(",") if l.strip()]
+    for field, param in (("labels_mode", "labels_mode"), ("min_count", "min_count"),
+                         ("min_confidence", "min_confidence"), ("status", "status"),
+                         ("after", "uploaded_after"), ("before", "uploaded_before")):
+        if criteria[field]:
+            params.append((param, criteria[field]))
+    if cursor:
+        params.append(("cursor", cursor))
+    r = await db_get("/videos/search", params=params)
+    if r.status_code != 200:
+        return {"items": [], "next_cursor": None, "estimated_total": 0, "error": r.text}
+    return r.json()
+
+
+@app.get("/status/{video_id}/events")
+async def status_events(video_id: int):
+    """
+    Проксирует SSE-поток смен статуса из DB-сервиса странице статуса:
+    одно удерживаемое соединение вместо периодических перезагрузок.
+    """
+    # Поток держит соединение до processed / error — отдельный пул, не общий
+    client = http_client.get_stream_client()
+    request = client.build_request("GET", f"/videos/{video_id}/events")
+    try:
+        upstream = await client.send(request, stream=True)
+    except httpx.HTTPError:
+        # Пул потоков исчерпан или DB-сервис недоступен — страница перейдёт на перезагрузку
+        raise HTTPException(503, "status stream unavailable")
+    if upstream.status_code != 200:
+        await upstream.aclose()
+        raise HTTPException(upstream.status_code, "video not found")
+
+    async def relay():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(
+        relay(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/search", response_class=HTMLResponse)
-async def search_page(request: Request, q: str = ""):
-    results = []
-    if q:
-        r = await db_get("/search", params={"q": q})
-        results = r.json() if r.status_code == 200 else []
+async def search_page(request: Request, q: str = "", cursor: str | None = None,
+                      labels: str = "", labels_mode: str = "all", min_count: str = "",
+                      min_confidence: str = "", status: str = "", after: str = "", before: str = ""):
+    criteria = {
+        "labels": labels, "labels_mode": labels_mode, "min_count": min_count,
+        "min_confidence": min_confidence, "status": status, "after": after, "before": before,
+    }
+    results, next_query, videos = [], None, None
+    if labels or status or after or before:
+        videos = await search_videos_by_criteria(criteria, cursor)
+        if videos.get("next_cursor"):
+            next_query = urlencode({**criteria, "cursor": videos["next_cursor"]})
+    elif q:
+        params = {"q": q, "limit": 20}
+        if cursor:
+            params["cursor"] = cursor
+        r = await db_get("/search", params=params)
+        if r.status_code == 200:
+            page = r.json()
+            results = page["items"]
+            if page["next_cursor"]:
+                next_query = urlencode({"q": q, "cursor": page["next_cursor"]})
     return templates.TemplateResponse(
         "search.html",
-        {"request": request, "query": q, "results": results}
+        {"request": request, "query": q, "results": results, "next_query": next_query,
+         "videos": videos, "criteria": criteria}
     )
 
 # ---------- launch with  `uvicorn web_api.app:app --reload --port 8080`
@@ -0,0 +1,73 @@
+# web_api/loadtest.py
+"""
+Простой нагрузочный тест задержек GET-запросов:
+
+    python -m web_api.loadtest http://localhost:8080/status/1 -n 2000 -c 50
+    python -m web_api.loadtest http://localhost:8000/videos/1 -n 2000 -c 50 --fresh-client
+
+Печатает p50 / p95 / p99 и число запросов в секунду. --fresh-client создаёт
+новый httpx.AsyncClient на каждый запрос (как раньше делали db_get/db_post и
+хэндлеры бота) — для сравнения с общим клиентом с keep-alive.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(url: str, total: int, concurrency: int, fresh_client: bool) -> tuple[list[float], int, float]:
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    shared = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=concurrency))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                if fresh_client:
+                    async with httpx.AsyncClient(timeout=30) as c:
+                        resp = await c.get(url)
+                else:
+                    resp = await shared.get(url)
+                if resp.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await shared.aclose()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure GET latency percentiles")
+    parser.add_argument("url")
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("--fresh-client", action="store_true")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(
+        run(args.url, args.requests, args.concurrency, args.fresh_client)
+    )
+    ms = [l * 1000 for l in latencies]
+    print(
+        f"{len(ms)} requests, {errors} errors, {len(ms) / elapsed:.1f} req/s  "
+        f"p50 {percentile(ms, 50):.1f} ms  p95 {percentile(ms, 95):.1f} ms  p99 {percentile(ms, 99):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
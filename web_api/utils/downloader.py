@@ -1,16 +1,41 @@
 # web_api/utils/downloader.py
-import asyncio, hashlib, os, shutil, shutil, tempfile, logging
+import hashlib, os, shutil, tempfile, logging
 from typing import Tuple
 from shutil import which
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 import yt_dlp
-from fastapi import HTTPException
 log = logging.getLogger(__name__)
 
-def _download_sync(url: str) -> Tuple[bytes, str]:
-    tmp_dir  = tempfile.mkdtemp(prefix="ydl_")
-    outtmpl  = os.path.join(tmp_dir, "%(id)s.%(ext)s")
+# Файлы меньше этого размера считаем неудачным скачиванием (заглушки, превью)
+MIN_VIDEO_BYTES = 1_000_000
 
+# Параметры ссылок, не влияющие на то, какое это видео
+TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid", "yclid", "ref", "from", "pp"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Приводит ссылку к каноническому виду для кэша источников:
+    схема https, хост в нижнем регистре без www./m., без фрагмента,
+    без трекинговых параметров, остальные параметры отсортированы.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def _ydl_opts(tmp_dir: str | None = None) -> dict:
     have_ffmpeg = which("ffmpeg") is not None
     # если ffmpeg нет – скачиваем только «цельный» поток
     if have_ffmpeg:
@@ -21,8 +46,7 @@ def _download_sync(url: str) -> Tuple[bytes, str]:
         ydl_format = "best[ext=mp4]/best"   # прогрессивный mp4
         merge_to   = None                   # не требуется
 
-    ydl_opts = {
-        "outtmpl": outtmpl,
+    opts = {
         "quiet": True,
         "no_warnings": True,
         "noprogress": True,
@@ -31,33 +55,52 @@ def _download_sync(url: str) -> Tuple[bytes, str]:
         "concurrent_fragment_downloads": 4,
         "retries": 5,
     }
+    if tmp_dir is not None:
+        opts["outtmpl"] = os.path.join(tmp_dir, "%(id)s.%(ext)s")
+    return opts
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=True)
-            title = info.get("title", "video")
-            final = ydl.prepare_filename(info)
-            if not final.lower().endswith(".mp4"):
-                final = os.path.splitext(final)[0] + ".mp4"
-        except Exception as exc:
-            raise RuntimeError(exc) from exc
 
-    data = open(final, "rb").read()
-    shutil.rmtree(tmp_dir, ignore_errors=True)
-    return data, title
+def probe(url: str) -> dict:
+    """
+    Метаданные ролика без скачивания (extractor_key, id, title ...).
+    """
+    try:
+        with yt_dlp.YoutubeDL(_ydl_opts()) as ydl:
+            return ydl.extract_info(url, download=False)
+    except Exception as exc:
+        raise RuntimeError(exc) from exc
 
 
-async def fetch_video_bytes(url: str) -> bytes:
+def download_to_file(url: str, info: dict | None = None) -> Tuple[str, str, str]:
+    """
+    Скачивает видео через yt-dlp во временный каталог (на диск, не в память).
+    info — результат probe(url), чтобы не запрашивать метаданные повторно.
+    Возвращает (путь к mp4, временный каталог, название); каталог удаляет вызывающий.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="ydl_")
     try:
-        data, title = await asyncio.to_thread(_download_sync, url)
-        if len(data) < 1_000_000:
+        with yt_dlp.YoutubeDL(_ydl_opts(tmp_dir)) as ydl:
+            if info is None:
+                info = ydl.extract_info(url, download=True)
+            else:
+                info = ydl.process_ie_result(info, download=True)
+            title = info.get("title", "video")
+            final = ydl.prepare_filename(info)
+            if not final.lower().endswith(".mp4"):
+                final = os.path.splitext(final)[0] + ".mp4"
+        if os.path.getsize(final) < MIN_VIDEO_BYTES:
             raise RuntimeError("Downloaded file is too small")
-        log.info("Downloaded «%s», %d bytes", title, len(data))
-        return data
     except Exception as exc:
-        log.exception("yt‑dlp failed: %s", exc)
-        raise HTTPException(400, "Не удалось получить mp4 из ссылки") from exc
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(exc) from exc
+
+    log.info("Downloaded «%s», %d bytes", title, os.path.getsize(final))
+    return final, tmp_dir, title
 
 
-def sha256_bytes(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+def sha256_file(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
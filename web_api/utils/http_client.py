@@ -0,0 +1,76 @@
+# web_api/utils/http_client.py
+"""
+Общий HTTP-клиент процесса web_api для обращений к DB-сервису:
+создаётся при старте приложения и закрывается при остановке,
+соединения переиспользуются (keep-alive) всеми запросами.
+Долгие запросы (SSE-поток статуса) идут через отдельный клиент со своим
+пулом соединений, чтобы открытые страницы статуса не занимали общий пул.
+"""
+import httpx
+from decouple import config
+
+DB_URL = config("DB_SERVICE_URL", default="http://localhost:8000")
+DB_HTTP_TIMEOUT = config("DB_HTTP_TIMEOUT", default=20.0, cast=float)
+DB_HTTP_MAX_CONNECTIONS = config("DB_HTTP_MAX_CONNECTIONS", default=100, cast=int)
+DB_HTTP_MAX_KEEPALIVE = config("DB_HTTP_MAX_KEEPALIVE", default=20, cast=int)
+# HTTP/2 требует пакет h2 (pip install "httpx[http2]")
+DB_HTTP2 = config("DB_HTTP2", default=False, cast=bool)
+# Сколько SSE-потоков статуса может быть открыто одновременно; при исчерпании
+# новый поток ждёт свободное соединение не дольше 5 с (страница перейдёт на перезагрузку)
+DB_HTTP_STREAM_CONNECTIONS = config("DB_HTTP_STREAM_CONNECTIONS", default=1000, cast=int)
+
+_client: httpx.AsyncClient | None = None
+_stream_client: httpx.AsyncClient | None = None
+
+
+def create_client(base_url: str = DB_URL) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(DB_HTTP_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=DB_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=DB_HTTP_MAX_KEEPALIVE,
+        ),
+        http2=DB_HTTP2,
+    )
+
+
+def create_stream_client(base_url: str = DB_URL) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(None, connect=5.0, pool=5.0),
+        limits=httpx.Limits(max_connections=DB_HTTP_STREAM_CONNECTIONS, max_keepalive_connections=0),
+    )
+
+
+async def start():
+    global _client, _stream_client
+    if _client is None:
+        _client = create_client()
+    if _stream_client is None:
+        _stream_client = create_stream_client()
+
+
+async def close():
+    global _client, _stream_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _stream_client is not None:
+        await _stream_client.aclose()
+        _stream_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client is not started")
+    return _client
+
+
+def get_stream_client() -> httpx.AsyncClient:
+    """
+    Клиент для удерживаемых соединений (SSE) с отдельным пулом.
+    """
+    if _stream_client is None:
+        raise RuntimeError("HTTP client is not started")
+    return _stream_client
@@ -0,0 +1,113 @@
+# web_api/utils/ingest.py
+"""
+Фоновая загрузка видео по ссылке.
+Запрос /upload/url только ставит задание и сразу отдаёт страницу /jobs/{id};
+скачивание идёт в отдельном пуле потоков, одновременно — не больше
+URL_INGEST_CONCURRENCY заданий, в очереди — не больше URL_INGEST_MAX_PENDING
+(сверх этого — 503). Состояние заданий хранится в памяти процесса web_api.
+Через тот же механизм заданий считается хэш прямых загрузок
+(см. hash_direct_upload в web_api/app.py); такие задания не ограничены
+ни слотами, ни URL_INGEST_MAX_PENDING — объект уже в хранилище, а чтение
+из него ограничено пулом потоков s3.storage.
+"""
+import asyncio, logging, shutil, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Tuple
+
+from decouple import config
+from fastapi import HTTPException
+
+from web_api.utils.downloader import download_to_file, probe as _probe, sha256_file
+
+log = logging.getLogger(__name__)
+
+URL_INGEST_CONCURRENCY = config("URL_INGEST_CONCURRENCY", default=2, cast=int)
+URL_INGEST_MAX_PENDING = config("URL_INGEST_MAX_PENDING", default=32, cast=int)
+# Сколько завершённых заданий помнить для страницы статуса
+URL_INGEST_HISTORY = config("URL_INGEST_HISTORY", default=500, cast=int)
+
+_executor = ThreadPoolExecutor(max_workers=URL_INGEST_CONCURRENCY, thread_name_prefix="ingest")
+_slots = asyncio.Semaphore(URL_INGEST_CONCURRENCY)
+_jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+_tasks: set = set()
+_pending = 0
+
+
+class IngestJob:
+    """
+    Задание на загрузку по ссылке.
+    status: queued → probing → downloading → hashing → uploading → done | error.
+    """
+
+    def __init__(self, url: str):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.status = "queued"
+        self.title = None
+        self.video_id = None
+        self.error = None
+        self.created = time.time()
+
+
+def get_job(job_id: str) -> IngestJob | None:
+    return _jobs.get(job_id)
+
+
+def submit(url: str, process: Callable[[IngestJob], Awaitable[None]], limited: bool = True) -> IngestJob:
+    """
+    Ставит ссылку в очередь. process(job) выполняет скачивание и регистрацию
+    и обновляет job.status / job.video_id. limited=False — задание не занимает
+    слот и не учитывается в URL_INGEST_MAX_PENDING.
+    """
+    global _pending
+    if limited and _pending >= URL_INGEST_MAX_PENDING:
+        raise HTTPException(503, "Слишком много ссылок в очереди, попробуйте позже")
+    job = IngestJob(url)
+    _jobs[job.id] = job
+    while len(_jobs) > URL_INGEST_HISTORY:
+        _jobs.popitem(last=False)
+    if limited:
+        _pending += 1
+    task = asyncio.create_task(_run(job, process, limited))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def _run(job: IngestJob, process, limited: bool = True):
+    global _pending
+    try:
+        if limited:
+            async with _slots:
+                await process(job)
+        else:
+            await process(job)
+        job.status = "done"
+    except Exception as exc:
+        log.exception("URL ingestion failed for %s", job.url)
+        job.status = "error"
+        job.error = str(exc)
+    finally:
+        if limited:
+            _pending -= 1
+
+
+async def probe(url: str) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _probe, url)
+
+
+async def download(url: str, info: dict | None = None) -> Tuple[str, str, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, download_to_file, url, info)
+
+
+async def sha256(path: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, sha256_file, path)
+
+
+async def cleanup(tmp_dir: str):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, shutil.rmtree, tmp_dir, True)